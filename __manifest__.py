@@ -8,10 +8,16 @@
     'website': 'https://www.example.com',
     'depends': ['account', 'sale', 'sale_management'],
     'data': [
+        'security/ir.model.access.csv',
         'data/mail_template_data_update.xml',
+        'data/cc_bcc_default_rule_data.xml',
+        'data/cc_bcc_send_job_data.xml',
         'views/inherited_account_move_send_wizard_form.xml',
         'views/inherited_mail_compose_message_form.xml',
         'views/inherited_sale_order_cancel_form.xml',
+        'views/cc_bcc_send_metric_views.xml',
+        'views/cc_bcc_default_rule_views.xml',
+        'views/cc_bcc_send_job_views.xml',
     ],
     'installable': True,
     'application': False,
@@ -1,5 +1,14 @@
+from . import cc_bcc_default_rule
+from . import cc_bcc_mail_body
+from . import cc_bcc_send_job
+from . import cc_bcc_send_metric
+from . import account_move_ext
 from . import account_move_send_wizard_ext
 from . import account_move_sent_ext
+from . import ir_mail_server_ext
+from . import mail_mail_ext
+from . import mail_template_ext
 from . import mail_thread_ext
+from . import res_partner_ext
 from . import mail_compose_message_ext
 from . import sale_order_cancel_ext
\ No newline at end of file
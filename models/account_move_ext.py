@@ -0,0 +1,29 @@
+import time
+
+from odoo import models, api
+
+
+class AccountMove(models.Model):
+    _inherit = 'account.move'
+
+    @api.model
+    def _cron_account_move_send(self, job_count=10):
+        """ Async invoice sending, with a configurable batch size
+        (``cc_bcc.invoice_send_cron_job_count``) and time budget in seconds
+        (``cc_bcc.invoice_send_cron_time_budget``): batches are processed until
+        the budget is spent, remaining invoices are left to the next run. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        job_count = int(ICP.get_param('cc_bcc.invoice_send_cron_job_count') or job_count)
+        time_budget = float(ICP.get_param('cc_bcc.invoice_send_cron_time_budget') or 0)
+        if not time_budget:
+            return super()._cron_account_move_send(job_count=job_count)
+
+        deadline = time.monotonic() + time_budget
+        remaining = self.search_count([('sending_data', '!=', False)])
+        while remaining and time.monotonic() < deadline:
+            super()._cron_account_move_send(job_count=job_count)
+            previous, remaining = remaining, self.search_count([('sending_data', '!=', False)])
+            if remaining >= previous:
+                break  # nothing could be processed, e.g. all invoices failing
+        if remaining:
+            self.env.ref('account.ir_cron_account_move_send')._trigger()
@@ -1,11 +1,16 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
+from odoo.tools.misc import format_amount, format_date
+
+from .cc_bcc_send_metric import SendProfiler, send_profiled
+
 
 class AccountMoveSendWizardExt(models.TransientModel):
     _inherit = 'account.move.send.wizard'
 
     cc_email_partner_ids = fields.Many2many('res.partner', 'cc_partners', string='CC Email', )
     bcc_email_partner_ids = fields.Many2many('res.partner', 'bcc_partners', string='CC Email', )
+    batch_move_ids = fields.Many2many('account.move', 'account_move_send_wizard_batch_move_rel', string='Batch Invoices')
 
     def default_get(self, fields_list):
         defaults = super().default_get(fields_list)
@@ -16,14 +21,13 @@ class AccountMoveSendWizardExt(models.TransientModel):
             return defaults
 
         res_ids = res_ids if isinstance(res_ids, list) else [res_ids]
-        partner_ids = []
-
-        for move in self.env['account.move'].browse(res_ids):
-            if move.invoice_user_id and move.invoice_user_id.partner_id:
-                partner_ids.append(move.invoice_user_id.partner_id.id)
-
-        if partner_ids:
-            defaults['cc_email_partner_ids'] = [(6, 0, list(set(partner_ids)))]
+        # batch send (list action): the first invoice is the one edited in the
+        # wizard, the others are sent along with their template defaults
+        if self._context.get('cc_bcc_batch_send') and 'batch_move_ids' in fields_list:
+            move_id = defaults.get('move_id') or res_ids[0]
+            defaults['batch_move_ids'] = [(6, 0, [mid for mid in res_ids if mid != move_id])]
+            res_ids = [move_id]
+        defaults.update(self.env['cc.bcc.default.rule']._get_default_partner_values('account.move', res_ids))
 
         return defaults
 
@@ -34,23 +38,9 @@ class AccountMoveSendWizardExt(models.TransientModel):
 
         return settings
 
-    @api.model
-    def _get_mail_params(self, move, move_data):
-        # Call the base implementation
-        params = super()._get_mail_params(move, move_data)
-
-        # Inject CC emails if provided
-        partner_ids = move_data.get('cc_email_partner_ids', [])
-        if partner_ids:
-            partners = self.env['res.partner'].browse(partner_ids)
-            emails = [p.email for p in partners if p.email]
-            if emails:
-                params['email_cc'] = ','.join(emails)
-
-        return params
-
     @api.depends('mail_template_id', 'mail_lang')
     def _compute_mail_subject_body_partners(self):
+        blocked_template_ids = self.env['mail.template']._cc_bcc_get_blocked_template_ids(self._name)
         for wizard in self:
             if wizard.mail_template_id:
                 wizard.mail_subject = self._get_default_mail_subject(
@@ -61,226 +51,343 @@ class AccountMoveSendWizardExt(models.TransientModel):
                     wizard.move_id, wizard.mail_template_id, wizard.mail_lang
                 )
                 # Optional: block recipients for a specific template
-                if wizard.mail_template_id.name in {'Invoice: Sending'}:
+                if wizard.mail_template_id.id in blocked_template_ids:
                     wizard.mail_partner_ids = False
             else:
                 wizard.mail_subject = False
                 wizard.mail_body = False
                 wizard.mail_partner_ids = False
 
-    def action_send_and_print(self, allow_fallback_pdf=False):
-        self.ensure_one()
-
-        if not self.mail_partner_ids:
-            raise UserError(_("Please select at least one recipient in the 'To' field before sending."))
+    def _get_cc_bcc_move_mail_values(self, move):
+        # the wizard move keeps the values edited in the wizard, other moves of
+        # the batch use their template defaults
+        if move == self.move_id:
+            manual = [x for x in (self.mail_attachments_widget or []) if x.get('manual')]
+            return {
+                'subject': self.mail_subject or '',
+                'body': self.mail_body or '',
+                'partner_ids': self.mail_partner_ids.ids,
+                'attachments_widget': self._get_default_mail_attachments_widget(
+                    move,
+                    self.mail_template_id,
+                    extra_edis=self.extra_edis or {},
+                    pdf_report=self.pdf_report_id if (not self.pdf_report_id or self.pdf_report_id.exists()) else False,
+                ) + manual,
+            }
+        mail_lang = self._get_default_mail_lang(move, self.mail_template_id)
+        return {
+            'subject': self._get_default_mail_subject(move, self.mail_template_id, mail_lang) or '',
+            'body': self._get_default_mail_body(move, self.mail_template_id, mail_lang) or '',
+            'partner_ids': self._get_default_mail_partner_ids(move, self.mail_template_id, mail_lang).ids,
+            'attachments_widget': self._get_default_mail_attachments_widget(
+                move,
+                self.mail_template_id,
+                pdf_report=self.pdf_report_id if (not self.pdf_report_id or self.pdf_report_id.exists()) else False,
+            ),
+        }
 
-        move = self.move_id
+    @api.model
+    def _get_cc_bcc_attachment_index(self, widgets_per_move):
+        """ Index the attachments referenced by name in the attachment widgets
+        of all moves, with a single query for the whole batch.
+
+        :param dict widgets_per_move: attachments widget values per move;
+
+        :return: dict {(move ID, attachment name): attachment ID};
+        """
+        names = {
+            item.get('name') or str(item.get('attachment_id') or item.get('id'))
+            for widget in widgets_per_move.values()
+            for item in widget
+            if not isinstance(item.get('attachment_id') or item.get('id'), int)
+        }
+        if not names:
+            return {}
+        moves = self.env['account.move'].concat(*widgets_per_move)
+        index = {}
+        # newest first, as a search with limit=1 on ir.attachment's default order would
+        for attachment in self.env['ir.attachment'].search_read([
+            ('name', 'in', list(names)),
+            ('res_model', '=', moves._name),
+            ('res_id', 'in', moves.ids),
+        ], ['name', 'res_id'], order='id desc'):
+            index.setdefault((attachment['res_id'], attachment['name']), attachment['id'])
+        return index
 
-        # Generate documents (same behavior as standard)
-        custom_settings = self._get_sending_settings()
-        self._check_sending_data(move, **custom_settings)
-        moves_data = {move.sudo(): {**self._get_default_sending_settings(move, from_cron=False, **custom_settings)}}
-        self._generate_invoice_documents(moves_data, allow_fallback_pdf=allow_fallback_pdf)
-        errors = {m: md for m, md in moves_data.items() if md.get('error')}
-        if allow_fallback_pdf and errors:
-            self._generate_invoice_fallback_documents(errors)
-
-        # Attachments from widget + manual
-        manual = [x for x in (self.mail_attachments_widget or []) if x.get('manual')]
-        widget = self._get_default_mail_attachments_widget(
-            move,
-            self.mail_template_id,
-            extra_edis=self.extra_edis or {},
-            pdf_report=self.pdf_report_id if (not self.pdf_report_id or self.pdf_report_id.exists()) else False,
-        )
-        widget += manual
+    @api.model
+    def _get_cc_bcc_attachment_ids(self, move, attachments_widget, attachment_index):
         attachment_ids = []
-        for item in widget:
+        for item in attachments_widget:
             att_id = item.get('attachment_id') or item.get('id')
             if isinstance(att_id, int):
                 attachment_ids.append(att_id)
             else:
-                name = item.get('name') or str(att_id)
-                existing = self.env['ir.attachment'].search([
-                    ('name', '=', name),
-                    ('res_model', '=', move._name),
-                    ('res_id', '=', move.id),
-                ], limit=1)
-                if existing:
-                    attachment_ids.append(existing.id)
-        seen = set()
-        attachment_ids = [x for x in attachment_ids if not (x in seen or seen.add(x))]
-
-        # Recipients & CC/BCC
-        recipient_links = [(4, pid) for pid in self.mail_partner_ids.ids]
-        mail_cc = ','.join(filter(None, getattr(self, 'cc_email_partner_ids', self.env['res.partner']).mapped('email')))
-        mail_bcc = ','.join(
-            filter(None, getattr(self, 'bcc_email_partner_ids', self.env['res.partner']).mapped('email')))
-
-        # Chatter message (RAW body; no banner in chatter)
-        message = self.env['mail.message'].sudo().create({
-            'model': move._name,
-            'res_id': move.id,
-            'message_type': 'email',
-            'subject': self.mail_subject or '',
-            'body': self.mail_body or '',
-            'author_id': self.env.user.partner_id.id,
-            'email_add_signature': False,  # avoid duplicate signature
-        })
-
-        # Ensure portal token so CTA can be generated
-        if hasattr(move, '_portal_ensure_token'):
-            move.sudo()._portal_ensure_token()
+                existing_id = attachment_index.get((move.id, item.get('name') or str(att_id)))
+                if existing_id:
+                    attachment_ids.append(existing_id)
+        return list(dict.fromkeys(attachment_ids))
 
-        # Model description
-        model_description = getattr(self.env[move._name], '_description', move._name)
-        if hasattr(move, '_get_model_description'):
-            try:
-                model_description = move._get_model_description(move._name)
-            except Exception:
-                pass
-
-        # Recipient groups (CTA/button)
-        base_msg_vals = {'partner_ids': self.mail_partner_ids.ids, 'model': move._name, 'res_id': move.id}
-        try:
-            rec_groups = move._notify_get_recipients_groups(message, model_description, msg_vals=base_msg_vals)
-        except TypeError:
-            try:
-                rec_groups = move._notify_get_recipients_groups(message, msg_vals=base_msg_vals,
-                                                                model_description=model_description)
-            except TypeError:
-                rec_groups = move._notify_get_recipients_groups(message)
-
-        def _norm_group(g):
-            if isinstance(g, dict):
-                d = dict(g);
-                d.setdefault('recipients', []);
-                d.setdefault('has_button_access', d.get('has_button_access', False));
-                return d
-            if isinstance(g, tuple) and len(g) == 2:
-                a, b = g
-                if isinstance(a, dict):
-                    d = dict(a);
-                    d.setdefault('recipients', b if isinstance(b, (list, tuple)) else []);
-                    d.setdefault('has_button_access', d.get('has_button_access', False));
-                    return d
-                if isinstance(b, dict):
-                    d = dict(b);
-                    d.setdefault('recipients', a if isinstance(a, (list, tuple)) else []);
-                    d.setdefault('has_button_access', d.get('has_button_access', False));
-                    return d
-            return {'recipients': [], 'has_button_access': False}
-
-        def _pid(r):
-            if isinstance(r, int): return r
-            if isinstance(r, dict): return r.get('id')
-            return getattr(r, 'id', None)
-
-        norm_groups = [_norm_group(g) for g in (rec_groups or [])]
-        group = None
-        dest_ids = set(self.mail_partner_ids.ids)
-        for g in norm_groups:
-            rec_ids = set(filter(None, (_pid(r) for r in g.get('recipients', []))))
-            if dest_ids & rec_ids:
-                group = g;
-                break
-        if not group:
-            group = norm_groups[0] if norm_groups else {'recipients': [], 'has_button_access': False}
-
-        # Fallback CTA to portal if needed
-        try:
-            if not group.get('has_button_access', False):
-                portal_url = False
-                if hasattr(move, 'get_portal_url'):
-                    portal_url = move.get_portal_url()
-                elif getattr(move, 'access_token', False):
-                    portal_url = f"/my/{move._name.replace('.', '/')}/{move.id}?access_token={move.access_token}"
-                if portal_url:
-                    base_url = move.get_base_url() if hasattr(move, 'get_base_url') else self.env[
-                        'ir.config_parameter'].sudo().get_param('web.base.url')
-                    label = _("View Invoice") if getattr(move, 'move_type', '') in ('out_invoice', 'out_refund') else _(
-                        "View Bill")
-                    group['has_button_access'] = True
-                    group['button_access'] = {'title': label, 'url': f"{base_url}{portal_url}", 'style': 'primary'}
-        except Exception:
-            pass
-
-        # ---------- Build header lines ----------
+    @api.model
+    def _get_cc_bcc_header_lines(self, move):
         partner_name = move.partner_id.name or ''
         record_title = f"{move.name} - {partner_name}" if partner_name else (move.name or move.display_name)
 
         amount_due_line = ''
         try:
-            from odoo.tools.misc import format_amount, format_date
-            amount_label = format_amount(self.env, getattr(move, 'amount_total', 0.0), move.currency_id) if getattr(
-                move, 'currency_id', False) else ''
-            due_label = format_date(self.env, move.invoice_date_due) if getattr(move, 'invoice_date_due', False) else ''
+            amount_label = format_amount(self.env, move.amount_total, move.currency_id) if move.currency_id else ''
+            due_label = format_date(self.env, move.invoice_date_due) if move.invoice_date_due else ''
             if amount_label and due_label:
                 amount_due_line = f"{amount_label} " + _("due %s") % due_label
             elif amount_label:
                 amount_due_line = amount_label
         except Exception:
-            symbol = getattr(getattr(move, 'currency_id', False), 'symbol', '') or ''
-            amt = getattr(move, 'amount_total', 0.0) or 0.0
-            amount_due_line = f"{symbol} {amt:,.2f}"
-            if getattr(move, 'invoice_date_due', False):
+            symbol = move.currency_id.symbol or ''
+            amount_due_line = f"{symbol} {move.amount_total or 0.0:,.2f}"
+            if move.invoice_date_due:
                 amount_due_line += " " + _("due %s") % move.invoice_date_due.strftime('%Y-%m-%d')
+        return [record_title, amount_due_line] if amount_due_line else [record_title]
 
-        # ---------- Prepare rendering context using our title ----------
-        render_values = move._notify_by_email_prepare_rendering_context(
-            message,
-            msg_vals={'model': move._name, 'record_name': record_title},  # <-- critical
-            model_description=model_description,
-        )
-        # Force both lines to appear even if the layout ignores record_name:
-        render_values['record_name'] = record_title
-        render_values['subtitles'] = [record_title, amount_due_line] if amount_due_line else [record_title]
-        render_values.update({
-            'body': self.mail_body or '',
-            'email_notification_force_header': True,
-            'email_notification_allow_footer': True,
+    @api.model
+    def _format_cc_bcc_error(self, error):
+        if isinstance(error, dict):
+            return '\n'.join(filter(None, [str(error.get('error_title') or '')] + [str(e) for e in error.get('errors') or []]))
+        return str(error)
+
+    def action_send_and_print(self, allow_fallback_pdf=False):
+        self.ensure_one()
+
+        if not self.mail_partner_ids:
+            raise UserError(_("Please select at least one recipient in the 'To' field before sending."))
+
+        moves = self.move_id | self.batch_move_ids
+        async_threshold = int(self.env['ir.config_parameter'].sudo().get_param('cc_bcc.invoice_send_async_threshold') or 0)
+        if async_threshold and len(self.batch_move_ids) > async_threshold:
+            # large runs: the wizard invoice is sent right away with its edited
+            # values, the others go to the async sending cron with their CC/BCC
+            self._enqueue_cc_bcc_moves(self.batch_move_ids - self.move_id)
+            moves = self.move_id
+        errors = self._send_cc_bcc_moves(moves, allow_fallback_pdf=allow_fallback_pdf)
+        if not errors:
+            return {'type': 'ir.actions.act_window_close'}
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'warning',
+                'sticky': True,
+                'title': _("%(count)s invoice(s) could not be sent", count=len(errors)),
+                'message': '\n'.join(f"{move.display_name}: {error}" for move, error in errors.items()),
+                'next': {'type': 'ir.actions.act_window_close'},
+            },
+        }
+
+    def _enqueue_cc_bcc_moves(self, moves):
+        """ Hand moves over to the async sending cron (account.move
+        ``_cron_account_move_send``). CC / BCC are persisted in ``sending_data``
+        and read back by ``_get_default_sending_settings``; like in a direct
+        batch send, each move gets the CC / BCC of its own rules. """
+        rule_partner_ids = self.env['cc.bcc.default.rule']._get_partner_ids_per_record('account.move', moves.ids)
+        for move in moves:
+            move.sending_data = {
+                'author_user_id': self.env.user.id,
+                'author_partner_id': self.env.user.partner_id.id,
+                'cc_email_partner_ids': rule_partner_ids[move.id]['cc'],
+                'bcc_email_partner_ids': rule_partner_ids[move.id]['bcc'],
+            }
+        self.env.ref('account.ir_cron_account_move_send')._trigger()
+
+    @send_profiled(lambda self, moves, *args, **kwargs: len(moves))
+    def _send_cc_bcc_moves(self, moves, allow_fallback_pdf=False):
+        """ Generate documents, then create messages, mails and notifications of
+        all moves in bulk. A move failing at any step is reported back and left
+        out of the batch instead of aborting it.
+
+        :return: dict {move: error message} of moves that were not sent;
+        """
+        self.ensure_one()
+        profiler = SendProfiler.current()
+        errors = {}
+
+        # Generate documents (same behavior as standard), in one go for all moves
+        custom_settings = self._get_sending_settings()
+        moves_data = {}
+        for move in moves:
+            try:
+                self._check_sending_data(move, **custom_settings)
+            except UserError as e:
+                errors[move] = str(e)
+                continue
+            moves_data[move.sudo()] = {**self._get_default_sending_settings(move, from_cron=False, **custom_settings)}
+        if moves_data:
+            self._generate_invoice_documents(moves_data, allow_fallback_pdf=allow_fallback_pdf)
+            doc_errors = {m: md for m, md in moves_data.items() if md.get('error')}
+            if allow_fallback_pdf and doc_errors:
+                self._generate_invoice_fallback_documents(doc_errors)
+            elif len(moves) > 1:
+                # in batch mode, do not mail a move without its documents
+                for move, move_data in doc_errors.items():
+                    errors[move.with_env(self.env)] = self._format_cc_bcc_error(move_data['error'])
+
+        moves = moves.filtered(lambda m: m not in errors)
+        if not moves:
+            return errors
+        profiler.lap('generate_documents')
+
+        # Per move values: subject, body, recipients, attachments from widget + manual
+        values_per_move = {}
+        for move in moves:
+            try:
+                # savepoint: a database error leaves the rest of the batch usable
+                with self.env.cr.savepoint():
+                    move_values = self._get_cc_bcc_move_mail_values(move)
+                    if not move_values['partner_ids']:
+                        raise UserError(_("No recipient to send the invoice to."))
+            except Exception as e:
+                errors[move] = str(e)
+                continue
+            values_per_move[move] = move_values
+        moves = moves.filtered(lambda m: m in values_per_move)
+        if not moves:
+            return errors
+        profiler.lap('prepare_values')
+
+        # Attachments: widget entries without ID are resolved with one query per batch
+        attachment_index = self._get_cc_bcc_attachment_index({
+            move: move_values['attachments_widget'] for move, move_values in values_per_move.items()
         })
+        for move, move_values in values_per_move.items():
+            move_values['attachment_ids'] = self._get_cc_bcc_attachment_ids(
+                move, move_values['attachments_widget'], attachment_index,
+            )
+        profiler.lap('resolve_attachments')
+
+        # CC/BCC: edited in the wizard for its move, from the rules for the others
+        Partner = self.env['res.partner']
+        rule_partner_ids = self.env['cc.bcc.default.rule']._get_partner_ids_per_record(
+            'account.move', (moves - self.move_id).ids,
+        )
+        cc_bcc_per_move = {
+            move: (
+                Partner._cc_bcc_get_email_string(rule_partner_ids[move.id]['cc']),
+                Partner._cc_bcc_get_email_string(rule_partner_ids[move.id]['bcc']),
+            ) for move in moves - self.move_id
+        }
+        cc_bcc_per_move[self.move_id] = (
+            Partner._cc_bcc_get_email_string(self.cc_email_partner_ids),
+            Partner._cc_bcc_get_email_string(self.bcc_email_partner_ids),
+        )
 
-        # Render final HTML (banner+button+footer) for the OUTGOING EMAIL ONLY
-        final_body = move._notify_by_email_render_layout(
-            message,
-            group,
-            msg_vals={'email_layout_xmlid': getattr(message, 'email_layout_xmlid', False)},
-            render_values=render_values,
-        ) or (self.mail_body or '')
-
-        # Do NOT write final_body back to chatter (keep chatter clean)
-        # message.write({'body': final_body})
-
-        # Create & send email (with banner)
-        mail_vals = {
-            'mail_message_id': message.id,
-            'subject': self.mail_subject or '',
-            'body_html': final_body,
-            'email_from': self.env.user.email_formatted,
-            'recipient_ids': recipient_links,
-            'attachment_ids': [(4, a) for a in attachment_ids],
+        # Chatter messages (RAW body; no banner in chatter)
+        messages = self.env['mail.message'].sudo().create([{
             'model': move._name,
             'res_id': move.id,
-        }
-        if mail_cc:
-            mail_vals['email_cc'] = mail_cc
-        if mail_bcc:
-            mail_vals['email_bcc'] = mail_bcc
+            'message_type': 'email',
+            'subject': values_per_move[move]['subject'],
+            'body': values_per_move[move]['body'],
+            'author_id': self.env.user.partner_id.id,
+            'email_add_signature': False,  # avoid duplicate signature
+        } for move in moves])
+        message_per_move = dict(zip(moves, messages))
+        profiler.lap('create_messages')
+
+        # Ensure portal tokens so CTA can be generated
+        moves._cc_bcc_ensure_portal_tokens()
+        portal_urls = moves._cc_bcc_get_portal_urls()
 
-        mail = self.env['mail.mail'].sudo().create(mail_vals)
-        mail.send()
+        # Model description
+        model_description = getattr(self.env[moves._name], '_description', moves._name)
+        if hasattr(moves, '_get_model_description'):
+            try:
+                model_description = moves._get_model_description(moves._name)
+            except Exception:
+                pass
 
-        # Notifications
+        mail_vals_list = []
+        for move in moves:
+            message = message_per_move[move]
+            move_values = values_per_move[move]
+            try:
+                # one savepoint per move, as above
+                with self.env.cr.savepoint():
+                    # Recipient groups (CTA/button)
+                    group = move._cc_bcc_get_recipients_group({move.id: message}, move_values['partner_ids'], model_description)[move.id]
+
+                    # Fallback CTA to portal if needed
+                    portal_url = portal_urls[move.id]
+                    if not group.get('has_button_access', False) and portal_url:
+                        label = _("View Invoice") if move.move_type in ('out_invoice', 'out_refund') else _("View Bill")
+                        group['has_button_access'] = True
+                        group['button_access'] = {'title': label, 'url': portal_url, 'style': 'primary'}
+
+                    # ---------- Prepare rendering context using our title ----------
+                    subtitles = self._get_cc_bcc_header_lines(move)
+                    record_title = subtitles[0]
+                    render_values = move._notify_by_email_prepare_rendering_context(
+                        message,
+                        msg_vals={'model': move._name, 'record_name': record_title},  # <-- critical
+                        model_description=model_description,
+                    )
+                    # Force both lines to appear even if the layout ignores record_name:
+                    render_values['record_name'] = record_title
+                    render_values['subtitles'] = subtitles
+                    render_values.update({
+                        'body': move_values['body'],
+                        'email_notification_force_header': True,
+                        'email_notification_allow_footer': True,
+                    })
+
+                    # Render final HTML (banner+button+footer) for the OUTGOING EMAIL ONLY
+                    final_body = move._cc_bcc_render_layout(
+                        message,
+                        group,
+                        msg_vals={'email_layout_xmlid': getattr(message, 'email_layout_xmlid', False)},
+                        render_values=render_values,
+                    ) or move_values['body']
+            except Exception as e:
+                errors[move] = str(e)
+                continue
+
+            # Do NOT write final_body back to chatter (keep chatter clean)
+            mail_vals = {
+                'mail_message_id': message.id,
+                'subject': move_values['subject'],
+                'body_html': final_body,
+                'email_from': self.env.user.email_formatted,
+                'recipient_ids': [(4, pid) for pid in move_values['partner_ids']],
+                'attachment_ids': [(4, a) for a in move_values['attachment_ids']],
+                'model': move._name,
+                'res_id': move.id,
+                'is_notification': True,
+            }
+            mail_cc, mail_bcc = cc_bcc_per_move[move]
+            if mail_cc:
+                mail_vals['email_cc'] = mail_cc
+            if mail_bcc:
+                mail_vals['email_bcc'] = mail_bcc
+            mail_vals_list.append(mail_vals)
+        profiler.lap('render_layouts')
+
+        # messages of moves that failed while rendering have nothing to notify
+        failed_messages = self.env['mail.message'].sudo().concat(*(message_per_move[m] for m in moves if m in errors))
+        failed_messages.unlink()
+
+        # Create emails (with banner), then their notifications updated by
+        # mail.mail once actually sent
+        MailMail = self.env['mail.mail'].sudo()
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(mail_vals_list)
+        mails = MailMail.create(MailMail._cc_bcc_store_bodies(mail_vals_list))
         self.env['mail.notification'].sudo().create([{
             'res_partner_id': pid,
-            'mail_message_id': message.id,
+            'mail_message_id': mail_vals['mail_message_id'],
             'mail_mail_id': mail.id,
-            'notification_status': 'sent',
+            'notification_status': 'ready',
             'notification_type': 'email',
             'is_read': True,
             'author_id': self.env.user.partner_id.id,
-        } for pid in self.mail_partner_ids.ids])
-
-        return {'type': 'ir.actions.act_window_close'}
+        } for mail_vals, mail in zip(mail_vals_list, mails) for _cmd, pid in mail_vals['recipient_ids']])
+        profiler.lap('create_mails')
 
+        mails._cc_bcc_dispatch(force_send=not mails._cc_bcc_is_deferred_send(self._name))
+        profiler.lap('dispatch')
+        return errors
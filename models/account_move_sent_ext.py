@@ -1,5 +1,8 @@
 from odoo import models, api
 
+CC_BCC_SETTINGS = ('cc_email_partner_ids', 'bcc_email_partner_ids')
+
+
 class AccountMoveSend(models.AbstractModel):
     _inherit = 'account.move.send'
 
@@ -8,15 +11,44 @@ class AccountMoveSend(models.AbstractModel):
         # Get default values from parent
         vals = super()._get_default_sending_settings(move, from_cron=from_cron, **custom_settings)
 
-        # Custom setting getter
+        # Custom setting getter: cron sends read the settings persisted on the move
         def get_setting(key, from_cron=False, default_value=None):
-            return custom_settings.get(key) if key in custom_settings else move.sending_data.get(key) if from_cron else default_value
+            return custom_settings.get(key) if key in custom_settings else (move.sending_data or {}).get(key, default_value) if from_cron else default_value
 
         # Only inject if sending by email
         if 'email' in vals.get('sending_methods', {}):
-            vals['cc_email_partner_ids'] = get_setting(
-                'cc_email_partner_ids',
-                default_value=[]
-            )
+            for key in CC_BCC_SETTINGS:
+                vals[key] = get_setting(key, from_cron=from_cron, default_value=[])
 
         return vals
+
+    @api.model
+    def _get_mail_params(self, move, move_data):
+        # Call the base implementation
+        params = super()._get_mail_params(move, move_data)
+
+        # Inject CC / BCC emails if provided
+        Partner = self.env['res.partner']
+        email_cc = Partner._cc_bcc_get_email_string(move_data.get('cc_email_partner_ids') or [])
+        email_bcc = Partner._cc_bcc_get_email_string(move_data.get('bcc_email_partner_ids') or [])
+        if email_cc:
+            params['email_cc'] = email_cc
+        if email_bcc:
+            params['email_bcc'] = email_bcc
+
+        return params
+
+    @api.model
+    def _generate_and_send_invoices(self, moves, from_cron=False, **kwargs):
+        if from_cron:
+            # CC / BCC partners of the whole cron batch, fetched at once
+            # instead of once per move in _get_mail_params
+            partner_ids = {
+                pid
+                for sending_data in moves.sudo().mapped('sending_data') if sending_data
+                for key in CC_BCC_SETTINGS
+                for pid in sending_data.get(key) or []
+            }
+            if partner_ids:
+                self.env['res.partner'].sudo().browse(partner_ids).fetch(['email', 'write_date'])
+        return super()._generate_and_send_invoices(moves, from_cron=from_cron, **kwargs)
@@ -0,0 +1,113 @@
+import logging
+
+from odoo import models, fields, api, tools, _
+from odoo.exceptions import ValidationError
+
+_logger = logging.getLogger(__name__)
+
+
+class CcBccDefaultRule(models.Model):
+    _name = 'cc.bcc.default.rule'
+    _description = 'CC/BCC Default Recipients Rule'
+    _order = 'model, sequence, id'
+
+    sequence = fields.Integer(default=10)
+    active = fields.Boolean(default=True)
+    model = fields.Char('Document Model', required=True, help="Technical name of the document model, e.g. sale.order")
+    field_path = fields.Char(
+        'Partner Field Path', required=True,
+        help="Path from the document to the partner to prefill, e.g. user_id.partner_id")
+    target = fields.Selection([('cc', 'CC'), ('bcc', 'BCC')], required=True, default='cc')
+
+    @api.constrains('model', 'field_path')
+    def _check_field_path(self):
+        for rule in self:
+            if rule.model not in self.env:
+                continue  # module of the model not installed (yet)
+            Target = self.env[rule.model]
+            try:
+                for fname in rule.field_path.split('.'):
+                    field = Target._fields[fname]
+                    if not field.relational:
+                        raise KeyError(fname)
+                    Target = self.env[field.comodel_name]
+            except KeyError:
+                raise ValidationError(_("Invalid field path %(path)s on %(model)s.", path=rule.field_path, model=rule.model))
+            if Target._name != 'res.partner':
+                raise ValidationError(_("Field path %(path)s must lead to a contact.", path=rule.field_path))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        self.env.registry.clear_cache()
+        return super().create(vals_list)
+
+    def write(self, vals):
+        self.env.registry.clear_cache()
+        return super().write(vals)
+
+    def unlink(self):
+        self.env.registry.clear_cache()
+        return super().unlink()
+
+    @api.model
+    @tools.ormcache('model_name')
+    def _get_rules(self, model_name):
+        rules = self.sudo().search([('model', '=', model_name)])
+        return tuple((rule.field_path, rule.target) for rule in rules)
+
+    @api.model
+    def _get_default_partner_values(self, model_name, res_ids):
+        """ Evaluate the rules of a model over the given records. The first
+        field of each path is read with one grouped query over all records;
+        the remaining path runs on its distinct values only.
+
+        :return: dict of wizard default values for cc_email_partner_ids and
+          bcc_email_partner_ids, only for targets having partners;
+        """
+        rules = self._get_rules(model_name) if model_name in self.env and res_ids else ()
+        partner_ids = {'cc': [], 'bcc': []}
+        for field_path, target in rules:
+            first_fname, _dot, sub_path = field_path.partition('.')
+            try:
+                groups = self.env[model_name].sudo()._read_group(
+                    [('id', 'in', list(res_ids))], groupby=[first_fname],
+                )
+                related = self.env[self.env[model_name]._fields[first_fname].comodel_name].sudo().concat(
+                    *(group for group, in groups)
+                )
+                partners = related.mapped(sub_path) if sub_path else related
+            except (KeyError, ValueError):
+                _logger.warning("Skipping invalid CC/BCC default rule %s on %s", field_path, model_name)
+                continue
+            partner_ids[target] += [pid for pid in partners.ids if pid not in partner_ids[target]]
+
+        return {
+            f'{target}_email_partner_ids': [(6, 0, ids)]
+            for target, ids in partner_ids.items() if ids
+        }
+
+    @api.model
+    def _get_partner_ids_per_record(self, model_name, res_ids):
+        """ Evaluate the rules of a model on each record separately, for batch
+        sends where each document gets its own CC/BCC. Each distinct related
+        record is followed only once; the ORM prefetches the path for the whole
+        batch.
+
+        :return: dict {res_id: {'cc': [partner IDs], 'bcc': [partner IDs]}};
+        """
+        result = {res_id: {'cc': [], 'bcc': []} for res_id in res_ids}
+        rules = self._get_rules(model_name) if model_name in self.env and res_ids else ()
+        records = self.env[model_name].sudo().browse(list(res_ids)) if rules else ()
+        for field_path, target in rules:
+            first_fname, _dot, sub_path = field_path.partition('.')
+            partners_per_related = {}
+            try:
+                for record in records:
+                    related = record[first_fname]
+                    if related not in partners_per_related:
+                        partners_per_related[related] = related.mapped(sub_path) if sub_path else related
+                    partner_ids = result[record.id][target]
+                    partner_ids += [pid for pid in partners_per_related[related].ids if pid not in partner_ids]
+            except (KeyError, ValueError):
+                _logger.warning("Skipping invalid CC/BCC default rule %s on %s", field_path, model_name)
+        return result
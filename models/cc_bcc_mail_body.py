@@ -0,0 +1,62 @@
+import hashlib
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+
+class CcBccMailBody(models.Model):
+    """ Rendered mail bodies stored once per distinct content. Outgoing mails
+    sent in body storage mode reference their body here instead of storing a
+    copy each; the body is resolved when the mail is sent. """
+    _name = 'cc.bcc.mail.body'
+    _description = 'CC/BCC Shared Mail Body'
+    _log_access = False
+
+    checksum = fields.Char(required=True, readonly=True, index=True)
+    body = fields.Html(readonly=True, sanitize=False)
+    mail_ids = fields.One2many('mail.mail', 'cc_bcc_body_id', string='Mails')
+    content_mail_ids = fields.One2many('mail.mail', 'cc_bcc_content_id', string='Mails (Content)')
+
+    _sql_constraints = [
+        ('checksum_uniq', 'unique(checksum)', 'A body is stored only once.'),
+    ]
+
+    @api.model
+    def _get_checksum(self, body):
+        return hashlib.sha256(str(body).encode()).hexdigest()
+
+    @api.model
+    def _get_body_ids(self, bodies):
+        """ Store the given bodies, once per distinct content. Concurrent sends
+        of the same body (layout skeletons are shared by every send of a
+        company and language) must not fail on the checksum constraint: rows
+        are inserted with ON CONFLICT DO NOTHING, existing ones selected after.
+
+        :param bodies: iterable of rendered bodies;
+        :return: dict {checksum: cc.bcc.mail.body ID};
+        """
+        body_per_checksum = {self._get_checksum(body): str(body) for body in bodies}
+        if not body_per_checksum:
+            return {}
+        self.flush_model(['checksum', 'body'])
+        self.env.cr.execute(SQL(
+            """INSERT INTO %s (checksum, body) VALUES %s
+               ON CONFLICT (checksum) DO NOTHING
+               RETURNING checksum, id""",
+            SQL.identifier(self._table),
+            SQL(', ').join(SQL('(%s, %s)', checksum, body) for checksum, body in body_per_checksum.items()),
+        ))
+        body_ids = dict(self.env.cr.fetchall())
+        missing = [checksum for checksum in body_per_checksum if checksum not in body_ids]
+        if missing:
+            self.env.cr.execute(SQL(
+                "SELECT checksum, id FROM %s WHERE checksum = ANY(%s)",
+                SQL.identifier(self._table), missing,
+            ))
+            body_ids.update(self.env.cr.fetchall())
+        return body_ids
+
+    @api.autovacuum
+    def _gc_unused_bodies(self):
+        # mails are auto deleted once sent, drop the bodies nobody refers to
+        self.sudo().search([('mail_ids', '=', False), ('content_mail_ids', '=', False)]).unlink()
@@ -0,0 +1,126 @@
+import logging
+
+from odoo import models, fields, api, modules, _
+from odoo.exceptions import UserError
+
+_logger = logging.getLogger(__name__)
+
+# composer fields replayed on every chunk of a streamed send
+COMPOSER_FIELDS = (
+    'subject', 'body', 'email_from', 'email_layout_xmlid',
+    'author_id', 'subtype_id', 'template_id',
+    'partner_ids', 'cc_email_partner_ids', 'bcc_email_partner_ids', 'attachment_ids',
+)
+
+
+class CcBccSendJob(models.Model):
+    """ Composer send streamed in chunks. Each chunk is sent and committed on
+    its own, with the ORM cache cleared in between, so that memory stays flat
+    and an interrupted job resumes after its last committed chunk instead of
+    sending everything again. """
+    _name = 'cc.bcc.send.job'
+    _description = 'CC/BCC Streamed Send Job'
+    _order = 'id desc'
+
+    name = fields.Char(required=True, readonly=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], required=True, default='pending', readonly=True, index=True)
+    user_id = fields.Many2one('res.users', string='Sent By', required=True, readonly=True, ondelete='cascade')
+    model = fields.Char('Document Model', required=True, readonly=True)
+    res_ids = fields.Json('Documents', required=True, readonly=True)
+    composer_values = fields.Json(required=True, readonly=True)
+    chunk_size = fields.Integer(required=True, readonly=True)
+    next_index = fields.Integer('Sent Documents', default=0, readonly=True)
+    record_count = fields.Integer('Documents Count', readonly=True)
+    error = fields.Text(readonly=True)
+
+    @api.model
+    def _get_chunk_size(self):
+        """ Chunk size of streamed sends, 0 when streaming is disabled. """
+        return int(self.env['ir.config_parameter'].sudo().get_param('cc_bcc.streaming_chunk_size') or 0)
+
+    @api.model
+    def _create_from_composer(self, composer, res_ids, chunk_size):
+        values = {}
+        for fname in COMPOSER_FIELDS:
+            field = composer._fields[fname]
+            if field.type == 'many2many':
+                values[fname] = composer[fname].ids
+            elif field.type == 'many2one':
+                values[fname] = composer[fname].id
+            else:
+                values[fname] = composer[fname] or False
+        job = self.sudo().create({
+            'name': composer.subject or _("Send to %(count)s %(model)s", count=len(res_ids), model=composer.model),
+            'user_id': self.env.uid,
+            'model': composer.model,
+            'res_ids': list(res_ids),
+            'record_count': len(res_ids),
+            'composer_values': values,
+            'chunk_size': chunk_size,
+        })
+        # attachments belong to the job until its chunks link them
+        composer.attachment_ids.sudo().write({'res_model': self._name, 'res_id': job.id})
+        return job
+
+    def _trigger(self):
+        self.env.ref('cc_bcc.ir_cron_cc_bcc_send_job')._trigger()
+
+    def action_resume(self):
+        failed = self.filtered(lambda job: job.state == 'failed')
+        if not failed:
+            raise UserError(_("Only failed jobs can be resumed."))
+        failed.write({'state': 'pending', 'error': False})
+        failed._trigger()
+
+    @api.model
+    def _cron_process_jobs(self):
+        # running jobs were interrupted (worker killed, server restart): their
+        # last committed chunk is known, resume after it
+        for job in self.search([('state', 'in', ('pending', 'running'))], order='id'):
+            job._process()
+
+    def _process(self):
+        """ Send the remaining chunks of the job, one transaction per chunk. """
+        self.ensure_one()
+        auto_commit = not modules.module.current_test
+        self.state = 'running'
+        while self.next_index < len(self.res_ids):
+            chunk = self.res_ids[self.next_index:self.next_index + self.chunk_size]
+            try:
+                with self.env.cr.savepoint():
+                    self._send_chunk(chunk)
+                    self.next_index += len(chunk)
+            except Exception as e:
+                _logger.exception("cc_bcc send job %s failed at %s/%s", self.id, self.next_index, len(self.res_ids))
+                self.write({'state': 'failed', 'error': str(e)})
+                if auto_commit:
+                    self.env.cr.commit()
+                return False
+            if auto_commit:
+                self.env.cr.commit()
+            # keep memory flat whatever the number of documents
+            self.env.invalidate_all()
+            _logger.info("cc_bcc send job %s: %s/%s documents sent", self.id, self.next_index, len(self.res_ids))
+        self.state = 'done'
+        if auto_commit:
+            self.env.cr.commit()
+        return True
+
+    def _send_chunk(self, res_ids):
+        values = dict(self.composer_values)
+        for fname in ('partner_ids', 'cc_email_partner_ids', 'bcc_email_partner_ids', 'attachment_ids'):
+            values[fname] = [(6, 0, values.get(fname) or [])]
+        composer = self.env['mail.compose.message'].with_user(self.user_id).with_context(
+            cc_bcc_send_job_id=self.id,
+        ).create(dict(
+            values,
+            composition_mode='comment',
+            model=self.model,
+            res_ids=repr(res_ids),
+        ))
+        return composer._action_send_mail_comment(res_ids)
@@ -0,0 +1,132 @@
+import cProfile
+import functools
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from odoo import models, fields, api
+from odoo.tools import str2bool
+
+_logger = logging.getLogger(__name__)
+
+_current_profiler = ContextVar('cc_bcc_send_profiler', default=None)
+
+
+def send_profiled(record_count, send_path=None):
+    """ Decorator instrumenting a send method with
+    ``cc.bcc.send.metric._cc_bcc_send_profiler``; the method closes its phases
+    on ``SendProfiler.current()``.
+
+    :param record_count: function called with the method arguments, returning
+      the number of records sent;
+    :param str send_path: name of the send, the model name by default;
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.env['cc.bcc.send.metric']._cc_bcc_send_profiler(
+                send_path or self._name, record_count(self, *args, **kwargs),
+            ):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SendProfiler:
+    """ Measures the named phases of one send: elapsed time and SQL queries
+    since the previous phase. A phase closed several times (e.g. inside a
+    loop) accumulates its measures. """
+
+    def __init__(self, cr, send_path, record_count):
+        self.cr = cr
+        self.send_path = send_path
+        self.record_count = record_count
+        self.phases = {}
+        self._start = self._last_time = time.perf_counter()
+        self._start_queries = self._last_queries = cr.sql_log_count
+
+    @staticmethod
+    def current():
+        """ Profiler of the send being run, see ``send_profiled``. """
+        return _current_profiler.get()
+
+    def lap(self, phase):
+        now, queries = time.perf_counter(), self.cr.sql_log_count
+        duration, query_count = self.phases.get(phase, (0.0, 0))
+        self.phases[phase] = (duration + (now - self._last_time) * 1000, query_count + queries - self._last_queries)
+        self._last_time, self._last_queries = now, queries
+
+    def log(self, level=logging.DEBUG):
+        if not _logger.isEnabledFor(level):
+            return
+        for phase, (duration, query_count) in self.phases.items():
+            _logger.log(
+                level,
+                "cc_bcc send=%s phase=%s records=%s duration_ms=%.1f queries=%s",
+                self.send_path, phase, self.record_count, duration, query_count,
+            )
+
+    def total(self):
+        return (time.perf_counter() - self._start) * 1000, self.cr.sql_log_count - self._start_queries
+
+
+class CcBccSendMetric(models.Model):
+    _name = 'cc.bcc.send.metric'
+    _description = 'CC/BCC Send Phase Metric'
+    _order = 'id desc'
+
+    send_path = fields.Char('Send Path', required=True, index=True, readonly=True)
+    phase = fields.Char('Phase', required=True, readonly=True)
+    record_count = fields.Integer('Records', readonly=True)
+    duration_ms = fields.Float('Duration (ms)', digits=(16, 1), readonly=True)
+    query_count = fields.Integer('Queries', readonly=True)
+
+    @api.model
+    @contextmanager
+    def _cc_bcc_send_profiler(self, send_path, record_count=0):
+        """ Instrument a send: yield a profiler whose ``lap(phase)`` closes a
+        named phase. The whole send is profiled with cProfile when the
+        ``cc_bcc_profile`` context key or the ``cc_bcc.send_profile`` parameter
+        is set (outermost send only, when sends nest), and phases are stored
+        as metrics when the ``cc_bcc.send_metrics`` parameter is set. Phases
+        are logged at INFO level in those cases, at DEBUG level otherwise; a
+        send closing no phase is not reported. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        profile = None
+        # sends nest (e.g. a wizard sending its mails inline): only the
+        # outermost one is profiled, cProfile cannot run twice at once
+        if _current_profiler.get() is None and (
+            self.env.context.get('cc_bcc_profile') or str2bool(ICP.get_param('cc_bcc.send_profile') or '0', default=False)
+        ):
+            profile = cProfile.Profile()
+            profile.enable()
+
+        profiler = SendProfiler(self.env.cr, send_path, record_count)
+        token = _current_profiler.set(profiler)
+        try:
+            yield profiler
+        finally:
+            _current_profiler.reset(token)
+            if profile:
+                profile.disable()
+                profile_dir = ICP.get_param('cc_bcc.send_profile_dir') or tempfile.gettempdir()
+                profile_path = os.path.join(profile_dir, f"cc_bcc_{send_path.replace('.', '_')}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.prof")
+                profile.dump_stats(profile_path)
+                _logger.info("cc_bcc send=%s profile written to %s", send_path, profile_path)
+
+        if not profiler.phases:
+            return
+        profiler.phases['total'] = profiler.total()
+        store_metrics = str2bool(ICP.get_param('cc_bcc.send_metrics') or '0', default=False)
+        profiler.log(logging.INFO if profile or store_metrics else logging.DEBUG)
+        if store_metrics:
+            self.sudo().create([{
+                'send_path': send_path,
+                'phase': phase,
+                'record_count': record_count,
+                'duration_ms': phase_duration,
+                'query_count': phase_queries,
+            } for phase, (phase_duration, phase_queries) in profiler.phases.items()])
@@ -0,0 +1,51 @@
+import hashlib
+
+from odoo import models, tools
+
+
+class IrMailServer(models.Model):
+    _inherit = 'ir.mail_server'
+
+    def connect(self, *args, **kwargs):
+        """ Report connection failures in the ``cc_bcc_connect_failures``
+        context set, when given: ``mail.mail.send`` catches them and only keeps
+        their message as ``failure_reason`` of the mails it could not send. """
+        try:
+            return super().connect(*args, **kwargs)
+        except Exception as exc:
+            connect_failures = self.env.context.get('cc_bcc_connect_failures')
+            if connect_failures is not None:
+                connect_failures.add(tools.exception_to_unicode(exc))
+            raise
+
+    def build_email(self, email_from, email_to, subject, body, *args, **kwargs):
+        """ Reuse the MIME parts of attachments shared by the mails of a send
+        batch: when the ``cc_bcc_mime_parts`` context dict is given, each
+        attachment is encoded once and the encoded part is attached to every
+        message of the batch, instead of base64 encoding it again per mail. """
+        mime_parts = self.env.context.get('cc_bcc_mime_parts')
+        attachments = kwargs.get('attachments')
+        if mime_parts is None or args or not attachments:
+            return super().build_email(email_from, email_to, subject, body, *args, **kwargs)
+
+        msg = super().build_email(email_from, email_to, subject, body, **dict(kwargs, attachments=None))
+        for fname, fcontent, mime in attachments:
+            raw = fcontent.encode() if isinstance(fcontent, str) else fcontent
+            key = (fname, mime, hashlib.sha1(raw).digest())
+            if key not in mime_parts:
+                mime_parts[key] = self._cc_bcc_build_attachment_part(msg, fname, fcontent, mime)
+            # same as EmailMessage.add_attachment, with the cached part
+            if msg.get_content_maintype() != 'multipart' or msg.get_content_subtype() != 'mixed':
+                msg.make_mixed()
+            msg.attach(mime_parts[key])
+        return msg
+
+    def _cc_bcc_build_attachment_part(self, msg, fname, fcontent, mime):
+        maintype, subtype = mime.split('/') if mime and '/' in mime else ('application', 'octet-stream')
+        part = type(msg)(policy=msg.policy)
+        if maintype == 'message' and subtype == 'rfc822':
+            # Use binary encoding for "message/rfc822" attachments (see RFC 2046 Section 5.2.1)
+            part.set_content(fcontent, maintype, subtype, filename=fname, cte='binary')
+        else:
+            part.set_content(fcontent, maintype, subtype, filename=fname)
+        return part
@@ -1,4 +1,20 @@
+import logging
+import re
+from functools import partial
+
 from odoo import fields, models, api
+from odoo.tools.misc import format_amount, format_date
+
+from .cc_bcc_send_metric import SendProfiler, send_profiled
+
+_logger = logging.getLogger(__name__)
+
+HTML_TAG_RE = re.compile(r'<[^>]*>')
+
+
+def _strip_html(text):
+    return HTML_TAG_RE.sub('', text or '').strip()
+
 
 class MailComposer(models.TransientModel):
     _inherit = 'mail.compose.message'
@@ -15,115 +31,195 @@ class MailComposer(models.TransientModel):
             return defaults
 
         res_ids = res_ids if isinstance(res_ids, list) else [res_ids]
-        partner_ids = []
-
-        if model in ['sale.order', 'purchase.order', 'account.move']:
-            records = self.env[model].browse(res_ids)
-            for record in records:
-                if model == 'sale.order' and record.user_id and record.user_id.partner_id:
-                    partner_ids.append(record.user_id.partner_id.id)
-                elif model == 'purchase.order' and record.user_id and record.user_id.partner_id:
-                    partner_ids.append(record.user_id.partner_id.id)
-
-        if partner_ids:
-            defaults['cc_email_partner_ids'] = [(6, 0, list(set(partner_ids)))]
+        defaults.update(self.env['cc.bcc.default.rule']._get_default_partner_values(model, res_ids))
 
         return defaults
 
     def _prepare_mail_values_rendered(self, res_ids):
         mail_values = super()._prepare_mail_values_rendered(res_ids)
 
+        email_cc, email_bcc = self._get_cc_bcc_emails()
         for res_id in res_ids:
-            if self.cc_email_partner_ids:
-                cc_emails = [p.email for p in self.cc_email_partner_ids if p.email]
-                if cc_emails:
-                    mail_values[res_id]['email_cc'] = ','.join(cc_emails)
-
-            if self.bcc_email_partner_ids:
-                bcc_email = [p.email for p in self.bcc_email_partner_ids if p.email]
-                if bcc_email:
-                    mail_values[res_id]['email_bcc'] = ','.join(bcc_email)
+            if email_cc:
+                mail_values[res_id]['email_cc'] = email_cc
+            if email_bcc:
+                mail_values[res_id]['email_bcc'] = email_bcc
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(list(mail_values.values()))
 
         return mail_values
 
+    def _get_cc_bcc_emails(self):
+        self.ensure_one()
+        Partner = self.env['res.partner']
+        return (
+            Partner._cc_bcc_get_email_string(self.cc_email_partner_ids),
+            Partner._cc_bcc_get_email_string(self.bcc_email_partner_ids),
+        )
+
     @api.depends('composition_mode', 'model', 'parent_id', 'res_domain', 'res_ids', 'template_id')
     def _compute_partner_ids(self):
-        block_templates = {
-            'Sales: Send Quotation',
-            'Purchase: Request For Quotation',
-            'Purchase: Purchase Order',
+        blocked_template_ids = self.env['mail.template']._cc_bcc_get_blocked_template_ids(self._name)
+        blocked = self.filtered(lambda wizard: wizard.template_id.id in blocked_template_ids)
+        blocked.partner_ids = False
+        super(MailComposer, self - blocked)._compute_partner_ids()
+
+    def _render_template_fields_batch(self, res_ids):
+        """ Render the template subject and body for all res_ids at once. Only
+        fields left blank in the composer are rendered, with one ``_render_field``
+        call per field; ``compute_lang`` makes the template group res_ids per
+        language so each language is set up and rendered a single time.
+
+        :return: dict {'subject': {res_id: value}, 'body_html': {res_id: value}}
+        """
+        rendered = {'subject': {}, 'body_html': {}}
+        if not self.template_id or not res_ids:
+            return rendered
+
+        for field_name, composer_value in (('subject', self.subject), ('body_html', self.body)):
+            if composer_value:
+                continue
+            try:
+                rendered[field_name] = self.template_id._render_field(field_name, res_ids, compute_lang=True) or {}
+            except Exception:
+                # one faulty record should not blank the whole batch: retry per record
+                for res_id in res_ids:
+                    try:
+                        value_map = self.template_id._render_field(field_name, [res_id], compute_lang=True)
+                        rendered[field_name][res_id] = (value_map or {}).get(res_id)
+                    except Exception:
+                        pass
+        return rendered
+
+    @api.model
+    def _get_portal_button_title(self, record):
+        if record._name == 'sale.order':
+            require_sig = bool(getattr(record, 'require_signature', False) or getattr(record, 'requires_signature', False))
+            require_pay = bool(getattr(record, 'require_payment', False) or getattr(record, 'requires_payment', False))
+            if require_sig or require_pay:
+                return "Sign & Pay Quotation"
+            return "View Quotation" if getattr(record, 'state', '') in ('draft', 'sent') else "View Order"
+        if record._name == 'account.move':
+            return "View Invoice" if getattr(record, 'move_type', '') in ('out_invoice', 'out_refund') else "View Bill"
+        if record._name == 'purchase.order':
+            return "View Order"
+        return "View Document"
+
+    def _get_author_signature_text(self):
+        author_partner = self.author_id or self.env.user.partner_id
+        author_user = self.env.user if author_partner == self.env.user.partner_id else (
+            author_partner.user_ids[:1] if author_partner.user_ids else self.env.user)
+        return _strip_html(getattr(author_user, 'signature', '') or '')
+
+    def _prepare_subtitles_batch(self, res_ids):
+        """ Compute the header subtitles of every record: record name, then
+        the amount or, for RFQs, the order date. Values are read for all
+        res_ids at once and formatters are built once per currency.
+
+        :return: dict {res_id: list of subtitles};
+        """
+        Model = self.env[self.model]
+        fnames = [
+            fname for fname in ('display_name', 'amount_total', 'amount_untaxed', 'currency_id', 'date_order', 'date')
+            if fname in Model._fields
+        ]
+        rfq_template = self.env.ref('purchase.email_template_edi_purchase', raise_if_not_found=False)
+        is_rfq = bool(rfq_template) and self.template_id == rfq_template
+        lang_code = self.env.lang
+
+        records_data = Model.browse(res_ids).read(fnames)
+        currencies = self.env['res.currency'].browse({
+            vals['currency_id'][0] for vals in records_data if vals.get('currency_id')
+        })
+        amount_formatters = {
+            currency.id: partial(format_amount, self.env, currency=currency, lang_code=lang_code)
+            for currency in currencies
         }
-        for wizard in self:
-            if wizard.template_id and wizard.template_id.name in block_templates:
-                wizard.partner_ids = False
-            else:
-                super(MailComposer, wizard)._compute_partner_ids()
 
+        subtitles_per_record = {}
+        for vals in records_data:
+            subtitles = [vals['display_name']]
+            currency_id = vals['currency_id'][0] if vals.get('currency_id') else False
+
+            # amount if available
+            amount_label = False
+            amount = vals['amount_total'] if 'amount_total' in vals else vals.get('amount_untaxed')
+            if currency_id and amount is not None:
+                try:
+                    amount_label = amount_formatters[currency_id](amount)
+                except Exception:
+                    amount_label = f"{currencies.browse(currency_id).symbol or ''} {amount}"
+
+            # RFQ (Purchase: Request For Quotation) -> "Order due {date}"
+            if is_rfq:
+                the_date = vals.get('date_order') or vals.get('date')
+                if the_date:
+                    try:
+                        subtitles.append("Order due %s" % format_date(self.env, the_date, lang_code=lang_code))
+                    except Exception:
+                        subtitles.append("Order due %s" % fields.Date.to_string(the_date))
+            elif amount_label:
+                subtitles.append(amount_label)
+            subtitles_per_record[vals['id']] = subtitles
+        return subtitles_per_record
+
+    def _mark_records_sent(self, res_ids):
+        if self.model not in ('sale.order', 'purchase.order'):
+            return
+        drafts = self.env[self.model].sudo().browse(res_ids).filtered(lambda r: r.state == 'draft')
+        if not drafts:
+            return
+        try:
+            # savepoint: a failing transition must not roll back the send itself
+            with self.env.cr.savepoint():
+                drafts.write({'state': 'sent'})
+        except Exception:
+            _logger.exception(
+                "Could not mark %s records %s as sent after sending them by email",
+                self.model, drafts.ids,
+            )
+
+    @send_profiled(lambda self, res_ids: len(res_ids))
     def _action_send_mail_comment(self, res_ids):
         self.ensure_one()
 
+        # streaming mode: large sends are handed over to a job sending them in
+        # committed chunks, see cc.bcc.send.job
+        SendJob = self.env['cc.bcc.send.job']
+        chunk_size = SendJob._get_chunk_size()
+        if chunk_size and len(res_ids) > chunk_size and not self.env.context.get('cc_bcc_send_job_id'):
+            SendJob._create_from_composer(self, res_ids, chunk_size)._trigger()
+            return self.env['mail.message']
+
+        profiler = SendProfiler.current()
         MailMessage = self.env['mail.message'].sudo()
         MailMail = self.env['mail.mail'].sudo()
         MailNotification = self.env['mail.notification'].sudo()
 
         result_messages = self.env['mail.message']
-
-        # helpers
-        def _normalize_group(g):
-            if isinstance(g, dict):
-                data = dict(g)
-                data.setdefault('recipients', [])
-                data.setdefault('has_button_access', data.get('has_button_access', False))
-                return data
-            if isinstance(g, tuple) and len(g) == 2:
-                a, b = g
-                if isinstance(a, dict):
-                    d = dict(a); d.setdefault('recipients', b if isinstance(b, (list, tuple)) else [])
-                    d.setdefault('has_button_access', d.get('has_button_access', False)); return d
-                if isinstance(b, dict):
-                    d = dict(b); d.setdefault('recipients', a if isinstance(a, (list, tuple)) else [])
-                    d.setdefault('has_button_access', d.get('has_button_access', False)); return d
-            return {'recipients': [], 'has_button_access': False}
-
-        def _partner_id_from_recipient(rec):
-            if isinstance(rec, dict):
-                return rec.get('id')
-            if isinstance(rec, int):
-                return rec
-            return getattr(rec, 'id', None)
-
-        def _strip_html(text):
-            import re
-            return re.sub(r'<[^>]*>', '', text or '').strip()
-
+        deferred = MailMail._cc_bcc_is_deferred_send(self._name)
+        email_cc, email_bcc = self._get_cc_bcc_emails()
+
+        # 1) Prefer UI edits; template only fills blanks (rendered once for all records)
+        rendered_fields = self._render_template_fields_batch(res_ids)
+        profiler.lap('render_templates')
+
+        # 2) Build the message values of every record, then create them at once
+        message_vals_list = []
+        subtype_id = self.subtype_id.id if self.subtype_id else self.env.ref('mail.mt_comment').id
+        author_signature = self._get_author_signature_text()
+        # the same attachments are linked to every message (and so mail) of
+        # the batch, without copying their data
+        attachments = self.attachment_ids.sudo()
+        attachment_links = [(4, attachment_id) for attachment_id in attachments.ids]
         for res_id in res_ids:
-            # 1) Prefer UI edits; template only fills blanks
-            rendered_subject = self.subject or ''
-            rendered_body = self.body or ''
-
-            if self.template_id:
-                if not rendered_subject:
-                    try:
-                        sub_map = self.template_id._render_field('subject', [res_id], compute_lang=True)
-                        rendered_subject = (sub_map or {}).get(res_id) or rendered_subject
-                    except Exception:
-                        pass
-                if not rendered_body:
-                    try:
-                        body_map = self.template_id._render_field('body_html', [res_id], compute_lang=True)
-                        rendered_body = (body_map or {}).get(res_id) or rendered_body
-                    except Exception:
-                        pass
+            rendered_subject = self.subject or rendered_fields['subject'].get(res_id) or ''
+            rendered_body = self.body or rendered_fields['body_html'].get(res_id) or ''
 
             # avoid double signature
-            author_partner = self.author_id or self.env.user.partner_id
-            author_user = self.env.user if author_partner == self.env.user.partner_id else (
-                author_partner.user_ids[:1] if author_partner.user_ids else self.env.user)
-            author_signature = _strip_html(getattr(author_user, 'signature', '') or '')
             has_sig_in_body = bool(author_signature and author_signature in _strip_html(rendered_body))
 
-            # 2) Create the message with exactly the edited body
-            message = MailMessage.create({
+            # message with exactly the edited body
+            message_vals_list.append({
                 'model': self.model,
                 'res_id': res_id,
                 'subject': rendered_subject,
@@ -132,75 +228,54 @@ class MailComposer(models.TransientModel):
                 'author_id': self.author_id.id,
                 'email_from': self.email_from,
                 'message_type': 'comment',
-                'subtype_id': self.subtype_id.id if self.subtype_id else self.env.ref('mail.mt_comment').id,
+                'subtype_id': subtype_id,
                 'email_add_signature': False if has_sig_in_body else True,
+                'attachment_ids': attachment_links,
             })
 
-            result_messages |= message
+        messages = MailMessage.create(message_vals_list)
+        if attachments:
+            attachments.write({'res_model': 'mail.message', 'res_id': messages[0].id})
+        result_messages |= self.env['mail.message'].browse(messages.ids)
+        profiler.lap('create_messages')
 
-            # ----- Standard layout + CTA -----
-            record = self.env[self.model].browse(res_id)
+        # 3) Standard layout + CTA for every record, then create all mails at once
+        records = self.env[self.model].browse(res_ids)
+        Model = self.env[self.model]
+        if hasattr(Model, '_get_model_description'):
+            try:
+                model_description = Model._get_model_description(self.model)
+            except Exception:
+                model_description = getattr(Model, '_description', False) or self.model
+        else:
+            model_description = getattr(Model, '_description', False) or self.model
+
+        # Ensure portal tokens so CTA/URL can be generated, then compute the
+        # fallback CTA of every record in one pass
+        records._cc_bcc_ensure_portal_tokens()
+        portal_urls = records._cc_bcc_get_portal_urls()
+        portal_buttons = {
+            record.id: {'title': self._get_portal_button_title(record), 'url': portal_urls[record.id], 'style': 'primary'}
+            for record in records if portal_urls.get(record.id)
+        }
 
-            # Ensure portal token so CTA/URL can be generated
-            if hasattr(record, '_portal_ensure_token'):
-                record.sudo()._portal_ensure_token()
+        # recipient groups (CTA source), looked up for all records at once
+        groups_per_record = records._cc_bcc_get_recipients_group(
+            dict(zip(res_ids, messages)), self.partner_ids.ids, model_description,
+        )
 
-            # model description
-            if hasattr(record, '_get_model_description'):
-                try:
-                    model_description = record._get_model_description(self.model)
-                except Exception:
-                    model_description = getattr(self.env[self.model], '_description', False) or self.model
-            else:
-                model_description = getattr(self.env[self.model], '_description', False) or self.model
+        # header subtitles of all records, from one prefetch
+        subtitles_per_record = self._prepare_subtitles_batch(res_ids)
 
-            # recipient groups (CTA source)
-            base_msg_vals = {'partner_ids': self.partner_ids.ids, 'model': self.model, 'res_id': res_id}
-            try:
-                recipients_groups = record._notify_get_recipients_groups(message, model_description, msg_vals=base_msg_vals)
-            except TypeError:
-                try:
-                    recipients_groups = record._notify_get_recipients_groups(message, msg_vals=base_msg_vals, model_description=model_description)
-                except TypeError:
-                    recipients_groups = record._notify_get_recipients_groups(message)
-
-            norm_groups = [_normalize_group(g) for g in (recipients_groups or [])]
-            partner_set = set(self.partner_ids.ids)
-            group = None
-            for g in norm_groups:
-                rec_ids = set(filter(None, (_partner_id_from_recipient(r) for r in g.get('recipients', []))))
-                if partner_set & rec_ids:
-                    group = g
-                    break
-            if not group:
-                group = norm_groups[0] if norm_groups else {'recipients': [], 'has_button_access': False}
+        mail_vals_list = []
+        for res_id, message in zip(res_ids, messages):
+            record = self.env[self.model].browse(res_id)
+            group = groups_per_record[res_id]
 
             # Fallback CTA
-            try:
-                if not group.get('has_button_access', False):
-                    if hasattr(record, '_portal_ensure_token'):
-                        record.sudo()._portal_ensure_token()
-                    portal_url = False
-                    if hasattr(record, 'get_portal_url'):
-                        portal_url = record.get_portal_url()
-                    elif hasattr(record, 'access_token') and getattr(record, 'access_token'):
-                        portal_url = f"/my/{record._name.replace('.', '/')}/{record.id}?access_token={record.access_token}"
-                    if portal_url:
-                        base_url = record.get_base_url() if hasattr(record, 'get_base_url') else self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-                        label = "View Document"
-                        name = record._name
-                        if name == 'sale.order':
-                            require_sig = bool(getattr(record, 'require_signature', False) or getattr(record, 'requires_signature', False))
-                            require_pay = bool(getattr(record, 'require_payment', False) or getattr(record, 'requires_payment', False))
-                            label = "Sign & Pay Quotation" if (require_sig or require_pay) else ("View Quotation" if getattr(record, 'state', '') in ('draft', 'sent') else "View Order")
-                        elif name == 'account.move':
-                            label = "View Invoice" if getattr(record, 'move_type', '') in ('out_invoice', 'out_refund') else "View Bill"
-                        elif name == 'purchase.order':
-                            label = "View Order"
-                        group['has_button_access'] = True
-                        group['button_access'] = {'title': label, 'url': f"{base_url}{portal_url}", 'style': 'primary'}
-            except Exception:
-                pass
+            if not group.get('has_button_access', False) and res_id in portal_buttons:
+                group['has_button_access'] = True
+                group['button_access'] = dict(portal_buttons[res_id])
 
             # render context
             render_values = record._notify_by_email_prepare_rendering_context(
@@ -209,52 +284,7 @@ class MailComposer(models.TransientModel):
                 model_description=model_description,
             )
 
-            # subtitles
-            template_name = (self.template_id.name or '') if self.template_id else ''
-            subtitles = [record.display_name]
-
-            amount_label = False
-            date_label = False
-            try:
-                from odoo.tools.misc import format_amount, format_date
-            except Exception:
-                from odoo.tools.misc import format_amount
-                format_date = None
-
-            # amount if available
-            try:
-                if hasattr(record, 'amount_total') and getattr(record, 'currency_id', False):
-                    amount_label = format_amount(self.env, record.amount_total, record.currency_id)
-                elif hasattr(record, 'amount_untaxed') and getattr(record, 'currency_id', False):
-                    amount_label = format_amount(self.env, record.amount_untaxed, record.currency_id)
-            except Exception:
-                if hasattr(record, 'currency_id') and getattr(record, 'amount_total', False) is not False:
-                    symbol = getattr(record.currency_id, 'symbol', '') or ''
-                    amount_label = f"{symbol} {record.amount_total}"
-
-            # RFQ (Purchase: Request For Quotation) -> "Order due {date}"
-            if template_name == 'Purchase: Request For Quotation':
-                the_date = getattr(record, 'date_order', False) or getattr(record, 'date', False)
-                if the_date:
-                    try:
-                        if format_date:
-                            date_label = "Order due %s" % format_date(self.env, the_date)
-                        else:
-                            date_label = "Order due %s" % fields.Date.to_string(the_date)
-                    except Exception:
-                        date_label = "Order due %s" % fields.Date.to_string(the_date)
-
-            if template_name in ('Sales: Send Quotation', 'Purchase: Purchase Order'):
-                if amount_label:
-                    subtitles.append(amount_label)
-            elif template_name == 'Purchase: Request For Quotation':
-                if date_label:
-                    subtitles.append(date_label)
-            else:
-                if amount_label:
-                    subtitles.append(amount_label)
-
-            render_values['subtitles'] = subtitles
+            render_values['subtitles'] = subtitles_per_record[res_id]
 
             # force header/footer; keep the exact edited body
             render_values.update({
@@ -264,7 +294,7 @@ class MailComposer(models.TransientModel):
             })
 
             # render layout
-            mail_body = record._notify_by_email_render_layout(
+            mail_body = record._cc_bcc_render_layout(
                 message,
                 group,
                 msg_vals={'email_layout_xmlid': getattr(message, 'email_layout_xmlid', False)},
@@ -273,55 +303,47 @@ class MailComposer(models.TransientModel):
 
             email_body_html = mail_body or message.body
 
-            # 3) mail.mail with CC/BCC
+            # mail.mail with CC/BCC
+            # attachments come from the message, see above
             recipient_links = [(4, pid) for pid in self.partner_ids.ids]
-            att_ids = []
-            if self.attachment_ids:
-                self.attachment_ids.sudo().write({'res_model': 'mail.message', 'res_id': message.id})
-                att_ids = self.attachment_ids.ids
-
             mail_values = {
                 'mail_message_id': message.id,
-                'subject': rendered_subject,
+                'subject': message.subject,
                 'body_html': email_body_html,
                 'email_from': self.email_from,
                 'recipient_ids': recipient_links,
-                'attachment_ids': [(4, a) for a in att_ids],
+                'is_notification': True,
             }
-            if self.cc_email_partner_ids:
-                cc_emails = [p.email for p in self.cc_email_partner_ids if p.email]
-                if cc_emails:
-                    mail_values['email_cc'] = ','.join(cc_emails)
-            if self.bcc_email_partner_ids:
-                bcc_emails = [p.email for p in self.bcc_email_partner_ids if p.email]
-                if bcc_emails:
-                    mail_values['email_bcc'] = ','.join(bcc_emails)
-
-            mail = MailMail.create(mail_values)
-            mail.send()
-
-            # 4) notifications
-            MailNotification.create([{
-                'res_partner_id': pid,
-                'mail_message_id': message.id,
-                'mail_mail_id': mail.id,
-                'notification_status': 'sent',
-                'notification_type': 'email',
-                'is_read': True,
-                'author_id': self.author_id.id,
-            } for pid in self.partner_ids.ids])
-
-            # 5) post-send state updates (non-blocking)
-            try:
-                if self.model == 'sale.order':
-                    so = record.sudo()
-                    if getattr(so, 'state', False) == 'draft':
-                        so.write({'state': 'sent'})
-                elif self.model == 'purchase.order':
-                    po = record.sudo()
-                    if getattr(po, 'state', False) == 'draft':
-                        po.write({'state': 'sent'})
-            except Exception:
-                pass
+            if email_cc:
+                mail_values['email_cc'] = email_cc
+            if email_bcc:
+                mail_values['email_bcc'] = email_bcc
+
+            mail_vals_list.append(mail_values)
+        profiler.lap('render_layouts')
+
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(mail_vals_list)
+        mails = MailMail.create(MailMail._cc_bcc_store_bodies(mail_vals_list))
+
+        # 4) notifications, updated by mail.mail once actually sent; mails are
+        #    created in the same order as their messages
+        MailNotification.create([{
+            'res_partner_id': pid,
+            'mail_message_id': message.id,
+            'mail_mail_id': mail.id,
+            'notification_status': 'ready',
+            'notification_type': 'email',
+            'is_read': True,
+            'author_id': self.author_id.id,
+        } for message, mail in zip(messages, mails) for pid in self.partner_ids.ids])
+        profiler.lap('create_mails')
+
+        # 5) post-send state updates (non-blocking), one write for all draft records
+        self._mark_records_sent(res_ids)
+        profiler.lap('state_updates')
+
+        # 6) dispatch all mails at once, inline or through the mail queue
+        mails._cc_bcc_dispatch(force_send=not deferred)
+        profiler.lap('dispatch')
 
         return result_messages
\ No newline at end of file
@@ -0,0 +1,169 @@
+import logging
+import smtplib
+import threading
+
+from odoo import SUPERUSER_ID, models, fields, api
+from odoo.modules.registry import Registry
+from odoo.tools import split_every, str2bool
+
+from .cc_bcc_send_metric import SendProfiler, send_profiled
+from .mail_thread_ext import LayoutBody, _substitute_layout
+
+_logger = logging.getLogger(__name__)
+
+
+class MailMail(models.Model):
+    _inherit = 'mail.mail'
+
+    cc_bcc_body_id = fields.Many2one('cc.bcc.mail.body', string='Shared Body', index='btree_not_null', ondelete='restrict')
+    cc_bcc_content_id = fields.Many2one('cc.bcc.mail.body', string='Shared Content', index='btree_not_null', ondelete='restrict')
+    cc_bcc_body_values = fields.Json('Shared Body Values')
+
+    @api.model
+    def _cc_bcc_is_deferred_send(self, wizard_model):
+        # context flag first, then the wizard specific parameter, then the global one
+        if 'cc_bcc_deferred_send' in self.env.context:
+            return bool(self.env.context['cc_bcc_deferred_send'])
+        ICP = self.env['ir.config_parameter'].sudo()
+        value = ICP.get_param(f'cc_bcc.deferred_send.{wizard_model}') or ICP.get_param('cc_bcc.deferred_send')
+        return str2bool(value or '0', default=False)
+
+    @api.model
+    def _cc_bcc_store_bodies(self, vals_list):
+        """ Body storage mode (``cc_bcc.body_storage`` parameter): move the
+        ``body_html`` of the given mail values to shared ``cc.bcc.mail.body``
+        rows, stored once per distinct content. Layouts rendered from a cached
+        skeleton are stored apart: the skeleton and the inner body are shared,
+        only the small per record values (record name, button URL, subtitles)
+        stay on the mail. Values are updated in place. """
+        if not str2bool(self.env['ir.config_parameter'].sudo().get_param('cc_bcc.body_storage') or '0', default=False):
+            return vals_list
+        to_store = [vals for vals in vals_list if vals.get('body_html') and not vals.get('cc_bcc_body_id')]
+        if not to_store:
+            return vals_list
+
+        parts_list = []
+        for vals in to_store:
+            body = vals['body_html']
+            if isinstance(body, LayoutBody) and body.skeleton:
+                values = dict(body.values)
+                parts_list.append((body.skeleton, values.pop('body', ''), values))
+            else:
+                parts_list.append((str(body), '', {}))
+
+        MailBody = self.env['cc.bcc.mail.body']
+        body_ids = MailBody._get_body_ids(
+            body for skeleton, content, _values in parts_list for body in (skeleton, content) if body
+        )
+        for vals, (skeleton, content, values) in zip(to_store, parts_list):
+            vals.update({
+                'body_html': False,
+                'cc_bcc_body_id': body_ids[MailBody._get_checksum(skeleton)],
+                'cc_bcc_content_id': content and body_ids[MailBody._get_checksum(content)],
+                'cc_bcc_body_values': values or False,
+            })
+        return vals_list
+
+    def _cc_bcc_get_stored_body(self):
+        """ Rebuild the body of a mail stored in body storage mode. """
+        self.ensure_one()
+        body = self.cc_bcc_body_id.body or ''
+        if not self.cc_bcc_content_id and not self.cc_bcc_body_values:
+            return body
+        values = dict(self.cc_bcc_body_values or {}, body=self.cc_bcc_content_id.body or '')
+        return _substitute_layout(str(body), values)
+
+    def _prepare_outgoing_body(self):
+        body = super()._prepare_outgoing_body()
+        if not body and self.cc_bcc_body_id:
+            return self._cc_bcc_get_stored_body()
+        return body
+
+    def _cc_bcc_dispatch(self, force_send=True, send_after_commit=True):
+        """ Send mails the same way mail.thread notifications are sent: inline
+        (after commit) for small batches, through the mail queue otherwise.
+
+        :param bool force_send: send right away when below the force send limit;
+          when False the mails stay outgoing and the mail queue sends them per
+          batch, reporting the status back on their notifications;
+        :param bool send_after_commit: send once the transaction is committed,
+          to avoid sending mails of a transaction that fails afterwards;
+        """
+        if not self:
+            return True
+
+        # NOTE:
+        #   1. above force_send_limit mails, use the queue system
+        #   2. do not send emails immediately if the registry is not loaded,
+        #      to prevent sending email during a simple update of the database
+        #      using the command-line.
+        test_mode = getattr(threading.current_thread(), 'testing', False)
+        if force_send:
+            force_send_limit = int(self.env['ir.config_parameter'].sudo().get_param('mail.mail.force.send.limit', 100))
+            force_send = len(self) < force_send_limit
+        if force_send and (not self.pool._init or test_mode):
+            # unless asked specifically, send emails after the transaction to
+            # avoid side effects due to emails being sent while the transaction fails
+            if not test_mode and send_after_commit:
+                self._cc_bcc_send_pooled_after_commit()
+            else:
+                self._cc_bcc_send_pooled()
+        else:
+            cron = self.env.ref('mail.ir_cron_mail_scheduler_action', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+        return True
+
+    def _cc_bcc_send_pooled_after_commit(self):
+        # as core send_after_commit: mails are sent as superuser, the user
+        # posting them usually has no access to mail.mail
+        dbname, context, mail_ids = self.env.cr.dbname, self.env.context, self.ids
+
+        @self.env.cr.postcommit.add
+        def _send_pooled():
+            with Registry(dbname).cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, context)
+                env['mail.mail'].browse(mail_ids).exists()._cc_bcc_send_pooled()
+
+    @send_profiled(lambda self: len(self))
+    def _cc_bcc_send_pooled(self):
+        """ Send mails collected by a wizard action through pooled SMTP
+        sessions: ``send`` opens one session per mail server configuration, so
+        sending them together reuses the connection (TLS handshake and login)
+        across messages. Sessions are capped to ``cc_bcc.smtp_session_batch_size``
+        messages (default ``mail.session.batch.size``). Mails failing on a
+        connection error are retried once in a fresh session. """
+        ICP = self.env['ir.config_parameter'].sudo()
+        session_size = int(
+            ICP.get_param('cc_bcc.smtp_session_batch_size') or ICP.get_param('mail.session.batch.size', 1000)
+        ) or 1000
+        # attachments shared by the mails are MIME encoded once per call;
+        # connection failures are collected by ir.mail_server.connect
+        connect_failures = set()
+        mails = self.with_context(
+            cc_bcc_mime_parts={}, cc_bcc_connect_failures=connect_failures,
+        ).filtered(lambda mail: mail.state == 'outgoing')
+        profiler = SendProfiler.current()
+        for mail_ids in split_every(session_size, mails.ids):
+            batch = mails.browse(mail_ids)
+            batch._cc_bcc_send_session()
+            # send records a connection failure as failure_reason of the mails
+            # (its failure_type only goes on notifications); mails of a session
+            # dropped by the server are left outgoing. Auto deleted mails are
+            # gone once sent.
+            reconnect = batch.exists().filtered(lambda mail: mail.state == 'outgoing' or (
+                mail.state == 'exception' and mail.failure_reason in connect_failures
+            ))
+            if reconnect:
+                _logger.info('Retrying %s mail(s) after SMTP connection failure', len(reconnect))
+                reconnect.write({'state': 'outgoing', 'failure_reason': False, 'failure_type': False})
+                reconnect._cc_bcc_send_session()
+            profiler.lap('smtp')
+        return True
+
+    def _cc_bcc_send_session(self):
+        try:
+            self.send()
+        except smtplib.SMTPServerDisconnected as exc:
+            # mails not sent yet stay outgoing, for a retry or the mail queue cron
+            _logger.info('SMTP session closed by the server while sending mails: %s', exc)
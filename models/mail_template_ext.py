@@ -0,0 +1,33 @@
+from odoo import models, api, tools
+
+# per wizard, templates whose default recipients are cleared so that the user
+# picks them
+DEFAULT_BLOCKED_TEMPLATE_XMLIDS = {
+    'mail.compose.message': ','.join([
+        'sale.email_template_edi_sale',
+        'purchase.email_template_edi_purchase',
+        'purchase.email_template_edi_purchase_done',
+    ]),
+    'account.move.send.wizard': 'account.email_template_edi_invoice',
+    'sale.order.cancel': 'sale.mail_template_sale_cancellation',
+}
+
+
+class MailTemplate(models.Model):
+    _inherit = 'mail.template'
+
+    @api.model
+    @tools.ormcache('wizard_model')
+    def _cc_bcc_get_blocked_template_ids(self, wizard_model):
+        """ IDs of the templates blocked in a wizard, listed (by xmlid) in the
+        ``cc_bcc.blocked_template_xmlids.<wizard model>`` parameter. Cached per
+        registry; setting the parameter clears the cache. """
+        xmlids = self.env['ir.config_parameter'].sudo().get_param(
+            f'cc_bcc.blocked_template_xmlids.{wizard_model}', DEFAULT_BLOCKED_TEMPLATE_XMLIDS.get(wizard_model, ''),
+        )
+        template_ids = set()
+        for xmlid in filter(None, (xmlid.strip() for xmlid in xmlids.split(','))):
+            template = self.env.ref(xmlid, raise_if_not_found=False)
+            if template and template._name == self._name:
+                template_ids.add(template.id)
+        return frozenset(template_ids)
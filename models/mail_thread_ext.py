@@ -1,6 +1,92 @@
-from odoo import models, api, Command
+import inspect
+import re
+import uuid
+
+from markupsafe import Markup, escape
+
+from odoo import models, api, tools, Command
 from odoo.tools import split_every, clean_context
-import threading
+
+from .cc_bcc_send_metric import SendProfiler, send_profiled
+
+# placeholders rendered into cached layout skeletons, substituted per record
+LAYOUT_PLACEHOLDER = '__cc_bcc_layout_%s__'
+LAYOUT_PLACEHOLDER_RE = re.compile(r'__cc_bcc_layout_(\w+?)__')
+
+
+def _substitute_layout(skeleton, values):
+    return LAYOUT_PLACEHOLDER_RE.sub(lambda match: values.get(match.group(1), ''), skeleton)
+
+
+class LayoutBody(Markup):
+    """ Layout rendered from a skeleton. Keeps the skeleton and the values
+    substituted into it, so that they can be stored apart (see
+    ``mail.mail._cc_bcc_store_bodies``). Markup operations return plain
+    layout bodies, without skeleton. """
+    skeleton = None
+    values = None
+
+    @classmethod
+    def from_skeleton(cls, skeleton, values):
+        body = cls(_substitute_layout(skeleton, values))
+        body.skeleton = skeleton
+        body.values = {key: str(value) for key, value in values.items()}
+        return body
+
+
+def _normalize_recipients_group(group):
+    if isinstance(group, dict):
+        data = dict(group)
+        data.setdefault('recipients', [])
+        data.setdefault('has_button_access', data.get('has_button_access', False))
+        return data
+    if isinstance(group, tuple) and len(group) == 2:
+        a, b = group
+        if isinstance(a, dict):
+            data = dict(a)
+            data.setdefault('recipients', b if isinstance(b, (list, tuple)) else [])
+            data.setdefault('has_button_access', data.get('has_button_access', False))
+            return data
+        if isinstance(b, dict):
+            data = dict(b)
+            data.setdefault('recipients', a if isinstance(a, (list, tuple)) else [])
+            data.setdefault('has_button_access', data.get('has_button_access', False))
+            return data
+    return {'recipients': [], 'has_button_access': False}
+
+
+# stand in customer group, for CC/BCC addresses when all recipients are internal
+CUSTOMER_GROUP_CC_BCC = {
+    'notification_group_name': 'customer',
+    'notification_is_customer': True,
+    'active': True,
+    'actions': [],
+    'button_access': {},
+    'has_button_access': False,
+    'recipients': [],
+}
+
+
+def _get_group_externality(group):
+    """ 2 for customer groups, 1 for portal ones, 0 for internal groups. """
+    name = group.get('notification_group_name') or ''
+    if group.get('notification_is_customer') or name == 'customer':
+        return 2
+    if 'portal' in name:
+        return 1
+    return 0
+
+
+def _recipient_partner_id(recipient):
+    if isinstance(recipient, dict):
+        return recipient.get('id')
+    if isinstance(recipient, int):
+        return recipient
+    return getattr(recipient, 'id', None)
+
+
+def _count_email_recipients(thread, message, recipients_data, *args, **kwargs):
+    return sum(recipient['notif'] == 'email' for recipient in recipients_data)
 
 
 class MailThread(models.AbstractModel):
@@ -11,11 +97,12 @@ class MailThread(models.AbstractModel):
         # Call super to get the base set
         params = super()._get_notify_valid_parameters()
 
-        # Add email_cc (and email_bcc if you plan to use it)
-        params.update({'email_cc'})  # or {'email_cc', 'email_bcc'}
+        # Add email_cc and email_bcc
+        params.update({'email_cc', 'email_bcc'})
 
         return params
 
+    @send_profiled(_count_email_recipients, send_path='mail.thread')
     def _notify_thread_by_email(self, message, recipients_data, msg_vals=False,
                                 mail_auto_delete=True,  # mail.mail
                                 model_description=False, force_email_company=False, force_email_lang=False,  # rendering
@@ -25,9 +112,20 @@ class MailThread(models.AbstractModel):
         partners_data = [r for r in recipients_data if r['notif'] == 'email']
         if not partners_data:
             return True
+        profiler = SendProfiler.current()
         additional_values = {'auto_delete': mail_auto_delete}
-        if 'email_cc' in kwargs:
-            additional_values['email_cc'] = kwargs['email_cc']
+        # CC and BCC ride along on one mail of the most external recipients
+        # group instead of being followers: one copy per address, customer
+        # layout. Addresses already notified by any mail of the message are
+        # dropped, once for the whole notification.
+        cc_bcc_values = {}
+        if kwargs.get('email_cc') or kwargs.get('email_bcc'):
+            cc_bcc_values = self.env['res.partner']._cc_bcc_dedupe_mail_values([{
+                'recipient_ids': [Command.link(r['id']) for r in partners_data],
+                'email_cc': kwargs.get('email_cc') or False,
+                'email_bcc': kwargs.get('email_bcc') or False,
+            }])[0]
+            cc_bcc_values = {fname: cc_bcc_values[fname] for fname in ('email_cc', 'email_bcc') if cc_bcc_values[fname]}
 
         base_mail_values = self._notify_by_email_get_base_mail_values(
             message,
@@ -42,15 +140,42 @@ class MailThread(models.AbstractModel):
             self.env['ir.config_parameter'].sudo().get_param('mail.batch_size')
         ) or 50  # be sure to not have 0, as otherwise no iteration is done
         notif_create_values = []
-        for _lang, render_values, recipients_group in self._notify_get_classified_recipients_iterator(
-                message,
-                partners_data,
-                msg_vals=msg_vals,
-                model_description=model_description,
-                force_email_company=force_email_company,
-                force_email_lang=force_email_lang,
-                subtitles=subtitles,
-        ):
+        # existing notifications of the message, loaded once and indexed per partner
+        existing_notifications_per_partner = {}
+        if resend_existing:
+            existing_notifications_per_partner = {
+                notification.res_partner_id.id: notification
+                for notification in self.env['mail.notification'].sudo().search([
+                    ('mail_message_id', '=', message.id),
+                    ('notification_type', '=', 'email'),
+                    ('res_partner_id', 'in', [r['id'] for r in partners_data]),
+                ])
+            }
+        # existing notifications to update, grouped per new mail
+        notif_update_per_email = {}
+        groups_data = list(self._notify_get_classified_recipients_iterator(
+            message,
+            partners_data,
+            msg_vals=msg_vals,
+            model_description=model_description,
+            force_email_company=force_email_company,
+            force_email_lang=force_email_lang,
+            subtitles=subtitles,
+        ))
+        cc_bcc_group = None
+        if cc_bcc_values:
+            cc_bcc_group = max(
+                (recipients_group for _lang, _values, recipients_group in groups_data
+                 if recipients_group.get('recipients') and _get_group_externality(recipients_group)),
+                key=_get_group_externality, default=None,
+            )
+            if cc_bcc_group is None and groups_data:
+                # internal recipients only: CC/BCC get their own mail, with
+                # the customer layout (no backend buttons nor actions)
+                groups_data.append((groups_data[0][0], groups_data[0][1], dict(CUSTOMER_GROUP_CC_BCC)))
+                cc_bcc_group = groups_data[-1][2]
+        profiler.lap('prepare')
+        for _lang, render_values, recipients_group in groups_data:
             # generate notification email content
             mail_body = self._notify_by_email_render_layout(
                 message,
@@ -58,32 +183,32 @@ class MailThread(models.AbstractModel):
                 msg_vals=msg_vals,
                 render_values=render_values,
             )
+            profiler.lap('render_layouts')
             recipients_ids = recipients_group.pop('recipients')
 
-            # create email
-            for recipients_ids_chunk in split_every(gen_batch_size, recipients_ids):
+            # create email (a recipient-less mail only for the stand-in CC/BCC group)
+            chunks = split_every(gen_batch_size, recipients_ids) if recipients_ids else [[]] if recipients_group is cc_bcc_group else []
+            for recipients_ids_chunk in chunks:
+                chunk_values = {'body_html': mail_body}
+                if recipients_group is cc_bcc_group:
+                    chunk_values.update(cc_bcc_values)
+                    cc_bcc_group = None
                 mail_values = self._notify_by_email_get_final_mail_values(
                     recipients_ids_chunk,
                     base_mail_values,
-                    additional_values={'body_html': mail_body}
+                    additional_values=chunk_values
                 )
-                new_email = SafeMail.create(mail_values)
+                new_email = SafeMail.create(SafeMail._cc_bcc_store_bodies([mail_values]))
 
                 if new_email and recipients_ids_chunk:
                     tocreate_recipient_ids = list(recipients_ids_chunk)
-                    if resend_existing:
-                        existing_notifications = self.env['mail.notification'].sudo().search([
-                            ('mail_message_id', '=', message.id),
-                            ('notification_type', '=', 'email'),
-                            ('res_partner_id', 'in', tocreate_recipient_ids)
-                        ])
-                        if existing_notifications:
-                            tocreate_recipient_ids = [rid for rid in recipients_ids_chunk if
-                                                      rid not in existing_notifications.mapped('res_partner_id.id')]
-                            existing_notifications.write({
-                                'notification_status': 'ready',
-                                'mail_mail_id': new_email.id,
-                            })
+                    if existing_notifications_per_partner:
+                        existing_ids = existing_notifications_per_partner.keys() & set(recipients_ids_chunk)
+                        if existing_ids:
+                            tocreate_recipient_ids = [rid for rid in recipients_ids_chunk if rid not in existing_ids]
+                            notif_update_per_email[new_email] = [
+                                existing_notifications_per_partner[rid].id for rid in existing_ids
+                            ]
                     notif_create_values += [{
                         'author_id': message.author_id.id,
                         'is_read': True,  # discard Inbox notification
@@ -94,26 +219,22 @@ class MailThread(models.AbstractModel):
                         'res_partner_id': recipient_id,
                     } for recipient_id in tocreate_recipient_ids]
                 emails += new_email
+            profiler.lap('create_mails')
 
+        for new_email, notification_ids in notif_update_per_email.items():
+            SafeNotification.browse(notification_ids).write({
+                'notification_status': 'ready',
+                'mail_mail_id': new_email.id,
+            })
         if notif_create_values:
             SafeNotification.create(notif_create_values)
+        profiler.lap('create_notifications')
 
-        # NOTE:
-        #   1. for more than 50 followers, use the queue system
-        #   2. do not send emails immediately if the registry is not loaded,
-        #      to prevent sending email during a simple update of the database
-        #      using the command-line.
-        test_mode = getattr(threading.current_thread(), 'testing', False)
-        if force_send := self.env.context.get('mail_notify_force_send', force_send):
-            force_send_limit = int(self.env['ir.config_parameter'].sudo().get_param('mail.mail.force.send.limit', 100))
-            force_send = len(emails) < force_send_limit
-        if force_send and (not self.pool._init or test_mode):
-            # unless asked specifically, send emails after the transaction to
-            # avoid side effects due to emails being sent while the transaction fails
-            if not test_mode and send_after_commit:
-                emails.send_after_commit()
-            else:
-                emails.send()
+        emails._cc_bcc_dispatch(
+            force_send=self.env.context.get('mail_notify_force_send', force_send),
+            send_after_commit=send_after_commit,
+        )
+        profiler.lap('dispatch')
 
         return True
 
@@ -121,7 +242,8 @@ class MailThread(models.AbstractModel):
                                                additional_values=None):
         """ Perform final formatting of values to create notification emails.
         Basic method just set the recipient partners as mail_mail recipients.
-        Override to generate other mail values like email_to or email_cc.
+        Override to generate other mail values like email_to, email_cc or
+        email_bcc.
 
         :param list recipient_ids: res.partner IDs to notify;
         :param dict mail_values: notification mail values;
@@ -134,7 +256,177 @@ class MailThread(models.AbstractModel):
         final_mail_values['recipient_ids'] = [Command.link(pid) for pid in recipient_ids]
         if additional_values and 'email_cc' in additional_values:
             final_mail_values['email_cc'] = additional_values['email_cc']
+        if additional_values and 'email_bcc' in additional_values:
+            final_mail_values['email_bcc'] = additional_values['email_bcc']
         if additional_values:
             final_mail_values.update(additional_values)
+        self.env['res.partner']._cc_bcc_dedupe_mail_values([final_mail_values])
         return final_mail_values
 
+    # ------------------------------------------------------------
+    # LAYOUT SKELETON CACHE
+    # ------------------------------------------------------------
+
+    def _cc_bcc_render_layout(self, message, recipients_group, msg_vals=False, render_values=None):
+        """ Same as ``_notify_by_email_render_layout`` but the layout wrapper
+        (header, footer, company logo, button) is rendered once per layout,
+        company, language and recipients group, with placeholders for the body,
+        record name, subtitles and button URL that are substituted per record.
+        Skeletons live in the registry 'templates' cache: bounded, LRU, and
+        cleared whenever views change. Company branding is part of the key
+        through its write_date. """
+        self.ensure_one()
+        render_values = render_values or {}
+        # same default layout as _notify_by_email_render_layout
+        layout_xmlid = (msg_vals.get('email_layout_xmlid') if msg_vals else message.email_layout_xmlid) \
+            or 'mail.mail_notification_layout'
+        button_access = recipients_group.get('button_access') or {}
+        # tracking values are message specific content rendered by the layout
+        if recipients_group.get('actions') or not isinstance(button_access, dict) or render_values.get('tracking_values'):
+            return self._notify_by_email_render_layout(message, recipients_group, msg_vals=msg_vals, render_values=render_values)
+
+        company = render_values.get('company') or self.env.company
+        subtitles = render_values.get('subtitles') or []
+        subtype = render_values.get('subtype')
+        skeleton_key = (
+            layout_xmlid,
+            company.id, company.write_date, company.partner_id.write_date,
+            render_values.get('lang') or self.env.lang,
+            str(render_values.get('model_description') or ''),
+            message.author_id.id, bool(render_values.get('email_add_signature')),
+            bool(recipients_group.get('has_button_access')), str(button_access.get('title') or ''),
+            len(subtitles),
+            # flags switching parts of the layout on or off
+            bool(render_values.get('email_notification_force_header')),
+            bool(render_values.get('email_notification_allow_footer')),
+            bool(render_values.get('is_discussion')),
+            subtype.id if isinstance(subtype, models.BaseModel) else subtype,
+            (msg_vals or {}).get('message_type') or message.message_type,
+        )
+        skeleton = self._cc_bcc_get_layout_skeleton(skeleton_key, message, recipients_group, msg_vals, render_values)
+        if not skeleton:
+            return self._notify_by_email_render_layout(message, recipients_group, msg_vals=msg_vals, render_values=render_values)
+
+        # the skeleton went through _replace_local_links with placeholders
+        # only, resolve the links of the substituted body the same way
+        values = {
+            'body': Markup(self.env['mail.render.mixin']._replace_local_links(Markup(render_values.get('body') or ''))),
+            'record_name': escape(render_values.get('record_name') or ''),
+            'button_url': escape(button_access.get('url') or ''),
+        }
+        values.update({f'subtitle{idx}': escape(subtitle or '') for idx, subtitle in enumerate(subtitles)})
+        return LayoutBody.from_skeleton(skeleton, values)
+
+    @tools.ormcache('skeleton_key', cache='templates')
+    def _cc_bcc_get_layout_skeleton(self, skeleton_key, message, recipients_group, msg_vals, render_values):
+        record_name = render_values.get('record_name')
+        skeleton_values = dict(
+            render_values,
+            body=LAYOUT_PLACEHOLDER % 'body',
+            record_name=LAYOUT_PLACEHOLDER % 'record_name',
+            subtitles=[LAYOUT_PLACEHOLDER % f'subtitle{idx}' for idx in range(len(render_values.get('subtitles') or []))],
+        )
+        skeleton_group = dict(recipients_group)
+        if skeleton_group.get('button_access'):
+            skeleton_group['button_access'] = dict(skeleton_group['button_access'], url=LAYOUT_PLACEHOLDER % 'button_url')
+        skeleton = self._notify_by_email_render_layout(message, skeleton_group, msg_vals=msg_vals, render_values=skeleton_values)
+        skeleton = str(skeleton or '')
+        # the layout may read record values outside of the placeholders: such a
+        # skeleton is specific to this record and cannot be shared
+        if not skeleton or (record_name and str(escape(record_name)) in skeleton) or str(escape(self.display_name)) in skeleton:
+            return None
+        return skeleton
+
+    # ------------------------------------------------------------
+    # PORTAL ACCESS
+    # ------------------------------------------------------------
+
+    def _cc_bcc_ensure_portal_tokens(self):
+        """ Batched ``_portal_ensure_token``: tokens of all tokenless records
+        are assigned together and flushed in one go instead of one write and
+        one UPDATE per record. """
+        if not hasattr(self, '_portal_ensure_token') or 'access_token' not in self._fields:
+            return
+        tokenless = self.sudo().filtered(lambda record: not record.access_token)
+        for record in tokenless:
+            record.access_token = str(uuid.uuid4())
+        tokenless.flush_recordset(['access_token'])
+
+    def _cc_bcc_get_portal_urls(self):
+        """ Absolute portal URL of each record. Base URLs are computed once per
+        company / website instead of once per record.
+
+        :return: dict {record ID: portal URL or False};
+        """
+        base_urls = {}
+        portal_urls = dict.fromkeys(self.ids, False)
+        base_url_fnames = [fname for fname in ('company_id', 'website_id') if fname in self._fields]
+        for record in self:
+            try:
+                portal_url = False
+                if hasattr(record, 'get_portal_url'):
+                    portal_url = record.get_portal_url()
+                elif getattr(record, 'access_token', False):
+                    portal_url = f"/my/{record._name.replace('.', '/')}/{record.id}?access_token={record.access_token}"
+                if not portal_url:
+                    continue
+                base_key = tuple(record[fname].id for fname in base_url_fnames)
+                if base_key not in base_urls:
+                    base_urls[base_key] = record.get_base_url()
+                portal_urls[record.id] = f"{base_urls[base_key]}{portal_url}"
+            except Exception:
+                continue
+        return portal_urls
+
+    # ------------------------------------------------------------
+    # RECIPIENTS GROUPS
+    # ------------------------------------------------------------
+
+    @api.model
+    @tools.ormcache()
+    def _cc_bcc_recipients_groups_params(self):
+        """ Optional parameters accepted by ``_notify_get_recipients_groups``
+        on this model. Inspected once per model instead of probing calling
+        conventions through ``TypeError`` for every record. """
+        parameters = inspect.signature(type(self)._notify_get_recipients_groups).parameters
+        return tuple(name for name in ('model_description', 'msg_vals') if name in parameters)
+
+    def _cc_bcc_get_recipients_group(self, messages, partner_ids, model_description):
+        """ Find the recipients group of each record, i.e. the first group
+        holding one of the given partners, or the first group as fallback.
+
+        :param dict messages: message to notify, per record ID;
+        :param list partner_ids: res.partner IDs the mail is sent to;
+        :param str model_description: model description used for groups;
+
+        :return: dict {record ID: normalized group}, each group being a copy
+          that the caller may update;
+        """
+        accepted_params = self._cc_bcc_recipients_groups_params()
+        partner_set = set(partner_ids)
+        # records whose groups hold the same recipients share the same outcome
+        match_cache = {}
+        groups_per_record = {}
+        for record in self:
+            call_values = {
+                'model_description': model_description,
+                'msg_vals': {'partner_ids': list(partner_ids), 'model': record._name, 'res_id': record.id},
+            }
+            recipients_groups = record._notify_get_recipients_groups(
+                messages[record.id], **{name: call_values[name] for name in accepted_params}
+            )
+            norm_groups = [_normalize_recipients_group(g) for g in (recipients_groups or [])]
+            if not norm_groups:
+                groups_per_record[record.id] = {'recipients': [], 'has_button_access': False}
+                continue
+
+            groups_key = tuple(
+                frozenset(filter(None, (_recipient_partner_id(r) for r in g.get('recipients', []))))
+                for g in norm_groups
+            )
+            if groups_key not in match_cache:
+                match_cache[groups_key] = next(
+                    (idx for idx, rec_ids in enumerate(groups_key) if partner_set & rec_ids), 0
+                )
+            groups_per_record[record.id] = norm_groups[match_cache[groups_key]]
+        return groups_per_record
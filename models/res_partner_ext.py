@@ -0,0 +1,84 @@
+from odoo import models, api, tools
+from odoo.exceptions import MissingError
+from odoo.tools import email_normalize, email_normalize_all, email_split_and_format
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    @api.model
+    def _cc_bcc_get_email_string(self, partners):
+        """ Turn partners into an ``email_cc`` / ``email_bcc`` string: emails
+        are normalized, invalid ones dropped and duplicates removed, keeping
+        the partners order.
+
+        :param partners: res.partner recordset or list of res.partner IDs;
+
+        :return: comma separated emails, '' when there is none;
+        """
+        partner_ids = partners.ids if isinstance(partners, models.BaseModel) else list(partners or [])
+        partners = self.sudo().browse(list(dict.fromkeys(pid for pid in partner_ids if pid)))
+        # read through the cache: partners prefetched for a whole batch cost
+        # no query, partners without email have nothing to add anyway
+        try:
+            partners = partners.filtered('email')
+        except MissingError:
+            # a partner was deleted meanwhile, e.g. for a send queued to the cron
+            partners = partners.exists().filtered('email')
+        if not partners:
+            return ''
+        # write_date in the key makes entries expire as soon as a partner changes
+        return self._cc_bcc_format_emails(tuple((partner.id, partner.write_date) for partner in partners))
+
+    @api.model
+    @tools.ormcache('partner_key')
+    def _cc_bcc_format_emails(self, partner_key):
+        emails = []
+        for partner in self.sudo().browse([partner_id for partner_id, _write_date in partner_key]):
+            emails += [email for email in email_normalize_all(partner.email or '') if email not in emails]
+        return ','.join(emails)
+
+    @api.model
+    def _cc_bcc_dedupe_mail_values(self, vals_list):
+        """ Last stage before creating mails: each address is kept once, in its
+        highest priority field, To (recipient partners, as ``recipient_ids``
+        commands or plain ``partner_ids``, and ``email_to``) then CC then BCC.
+        Addresses are compared normalized; the ones kept in
+        ``email_cc`` / ``email_bcc`` keep their original formatting. Recipient
+        partners are left untouched as they also carry the notifications.
+        Values are updated in place.
+
+        :param list vals_list: list of mail.mail values;
+        """
+        recipient_ids_per_vals = []
+        for vals in vals_list:
+            recipient_ids = []
+            # rendered mass mode values still hold plain partner IDs
+            for command in (vals.get('recipient_ids') or []) + (vals.get('partner_ids') or []):
+                if isinstance(command, int):
+                    recipient_ids.append(command)
+                elif command[0] == 4:
+                    recipient_ids.append(command[1])
+                elif command[0] == 6:
+                    recipient_ids += command[2]
+            recipient_ids_per_vals.append(recipient_ids)
+        # one batched read of all recipients emails
+        partners = self.sudo().browse({pid for recipient_ids in recipient_ids_per_vals for pid in recipient_ids})
+        emails_per_partner = {partner.id: email_normalize_all(partner.email or '') for partner in partners}
+
+        for vals, recipient_ids in zip(vals_list, recipient_ids_per_vals):
+            if not vals.get('email_cc') and not vals.get('email_bcc'):
+                continue
+            seen = set(email_normalize_all(vals.get('email_to') or ''))
+            for pid in recipient_ids:
+                seen.update(emails_per_partner.get(pid, []))
+            for fname in ('email_cc', 'email_bcc'):
+                kept = []
+                for email in email_split_and_format(vals.get(fname) or ''):
+                    normalized = email_normalize(email)
+                    if normalized and normalized not in seen:
+                        seen.add(normalized)
+                        kept.append(email)
+                if fname in vals:
+                    vals[fname] = ','.join(kept) or False
+        return vals_list
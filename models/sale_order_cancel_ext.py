@@ -1,11 +1,17 @@
-from odoo import fields, models, api
+from markupsafe import Markup, escape
+
+from odoo import fields, models, api, _
 from odoo.exceptions import UserError
 
+from .cc_bcc_send_metric import SendProfiler, send_profiled
+from .mail_thread_ext import LAYOUT_PLACEHOLDER, LayoutBody
+
 class SaleOrderCancel(models.TransientModel):
     _inherit = 'sale.order.cancel'
 
     cc_email_partner_ids = fields.Many2many('res.partner', 'sale_cancel_cc_partner_rel', string='CC Recipients')
     bcc_email_partner_ids = fields.Many2many('res.partner', 'sale_cancel_bcc_partner_rel', string='BCC Recipients')
+    order_ids = fields.Many2many('sale.order', 'sale_cancel_batch_order_rel', string='Other Orders')
     recipient_ids = fields.Many2many(
         'res.partner',
         string="Recipients",
@@ -17,30 +23,142 @@ class SaleOrderCancel(models.TransientModel):
     def default_get(self, fields_list):
         defaults = super().default_get(fields_list)
 
-        order_id = self._context.get('default_order_id')
+        # mass cancel: opened from the order list, the first order is the one
+        # displayed in the wizard and the others are cancelled along with it
+        order_ids = []
+        if self._context.get('active_model') == 'sale.order' and self._context.get('active_ids'):
+            order_ids = list(self._context['active_ids'])
+            if 'order_id' in fields_list and not defaults.get('order_id'):
+                defaults['order_id'] = order_ids[0]
+            if 'order_ids' in fields_list:
+                defaults['order_ids'] = [(6, 0, [oid for oid in order_ids if oid != defaults.get('order_id')])]
+
+        order_id = self._context.get('default_order_id') or defaults.get('order_id')
         if not order_id:
             return defaults
 
-        order = self.env['sale.order'].browse(order_id)
-        partner_ids = []
-
-        if order.user_id and order.user_id.partner_id:
-            partner_ids.append(order.user_id.partner_id.id)
-
-        if partner_ids:
-            defaults['cc_email_partner_ids'] = [(6, 0, list(set(partner_ids)))]
+        # CC/BCC of the wizard apply to its own order only, other orders of a
+        # mass cancel get theirs from the rules when their mail is built
+        defaults.update(self.env['cc.bcc.default.rule']._get_default_partner_values('sale.order', [order_id]))
 
         return defaults
 
     @api.depends('template_id', 'order_id')
     def _compute_recipient_ids(self):
-        block_templates = {'Sales: Order Cancellation'}
-        for wizard in self:
-            if wizard.template_id and wizard.template_id.name in block_templates:
-                wizard.recipient_ids = False
+        blocked_template_ids = self.env['mail.template']._cc_bcc_get_blocked_template_ids(self._name)
+        blocked = self.filtered(lambda wizard: wizard.template_id.id in blocked_template_ids)
+        blocked.recipient_ids = False
+        super(SaleOrderCancel, self - blocked)._compute_recipient_ids()
+
+    def _get_cc_bcc_order_mail_values(self, orders):
+        """ Subject, body, recipients and language of the cancellation mail of
+        each order. The wizard order keeps the values edited in the wizard,
+        other orders of the batch use their template defaults, rendered in one
+        go per field.
+
+        :return: dict {order ID: dict of values};
+        """
+        values_per_order = {}
+        other_orders = orders - self.order_id
+        if other_orders and self.template_id:
+            template = self.template_id
+            subjects = template._render_field('subject', other_orders.ids, compute_lang=True)
+            bodies = template._render_field('body_html', other_orders.ids, compute_lang=True)
+            langs = template._render_lang(other_orders.ids)
+            recipients = template._generate_template(
+                other_orders.ids, ('email_cc', 'email_to', 'partner_to'), find_or_create_partners=True,
+            )
+            for order in other_orders:
+                values_per_order[order.id] = {
+                    'subject': subjects.get(order.id) or f"Order {order.name} Cancelled",
+                    'body': bodies.get(order.id) or '',
+                    'partners': self.env['res.partner'].browse(recipients.get(order.id, {}).get('partner_ids') or []),
+                    'lang': langs.get(order.id) or self.env.lang,
+                }
+        else:
+            # the wizard body was written for the wizard order: other orders
+            # get a generic notice naming their own order and customer
+            for order in other_orders:
+                values_per_order[order.id] = {
+                    'subject': f"Order {order.name} Cancelled",
+                    'body': Markup(_("<p>Dear %(partner)s,</p><p>Your order %(order)s has been cancelled.</p>")) % {
+                        'partner': order.partner_id.name or '',
+                        'order': order.name,
+                    },
+                    'partners': order.partner_id,
+                    'lang': order.partner_id.lang or self.env.lang,
+                }
+
+        values_per_order[self.order_id.id] = {
+            'subject': self.subject or f"Order {self.order_id.name} Cancelled",
+            'body': self.body or '',
+            'partners': self.recipient_ids,
+            'lang': self.language or self.env.lang,
+        }
+        # CC/BCC: edited in the wizard for its order, from the rules for the others
+        Partner = self.env['res.partner']
+        rule_partner_ids = self.env['cc.bcc.default.rule']._get_partner_ids_per_record('sale.order', other_orders.ids)
+        for order_id, values in values_per_order.items():
+            if order_id == self.order_id.id:
+                values['email_cc'] = Partner._cc_bcc_get_email_string(self.cc_email_partner_ids)
+                values['email_bcc'] = Partner._cc_bcc_get_email_string(self.bcc_email_partner_ids)
+            else:
+                values['email_cc'] = Partner._cc_bcc_get_email_string(rule_partner_ids[order_id]['cc'])
+                values['email_bcc'] = Partner._cc_bcc_get_email_string(rule_partner_ids[order_id]['bcc'])
+            values['partners'] = values['partners'].filtered(lambda p: p.email)
+        return values_per_order
+
+    def _render_cc_bcc_cancel_layouts(self, messages_per_order):
+        """ Wrap the message of each order in ``mail.mail_notification_light``.
+        The layout is rendered once per company and language with placeholders
+        for the body and record name, and substituted per order. Falls back to
+        a full render when the layout output contains record specific values.
+
+        :return: dict {order ID: rendered body_html};
+        """
+        qweb = self.env['ir.qweb']
+        skeletons = {}
+        bodies = {}
+        for order, message in messages_per_order.items():
+            lang = message.env.context.get('lang') or self.env.lang
+            key = (order.company_id.id, lang)
+            render_values = {
+                'company': order.company_id,
+                'record': order,
+                'message': message,
+                # ensure header text: “Your Sales Order”
+                'model_description': getattr(order, '_description', 'Sales Order'),
+            }
+            if key not in skeletons:
+                skeleton_message = message.new({
+                    'record_name': LAYOUT_PLACEHOLDER % 'record_name',
+                    'author_id': message.author_id.id,
+                    'email_from': message.email_from,
+                })
+                skeleton = str(qweb.with_context(lang=lang)._render('mail.mail_notification_light', dict(
+                    render_values,
+                    body=Markup(LAYOUT_PLACEHOLDER % 'body'),
+                    message=skeleton_message,
+                )) or '')
+                # the layout may read record values outside of the placeholders
+                if str(escape(order.display_name)) in skeleton or str(escape(order.name)) in skeleton:
+                    skeleton = None
+                skeletons[key] = skeleton
+
+            if skeletons[key]:
+                values = {
+                    'body': Markup(message.body or ''),
+                    'record_name': escape(message.record_name or ''),
+                }
+                bodies[order.id] = LayoutBody.from_skeleton(skeletons[key], values)
             else:
-                super(SaleOrderCancel, wizard)._compute_recipient_ids()
+                wrapped = qweb.with_context(lang=lang)._render('mail.mail_notification_light', dict(
+                    render_values, body=message.body or '',
+                ))
+                bodies[order.id] = wrapped.decode() if isinstance(wrapped, bytes) else str(wrapped)
+        return bodies
 
+    @send_profiled(lambda self: len(self.order_id | self.order_ids))
     def action_send_mail_and_cancel(self):
         self.ensure_one()
 
@@ -48,59 +166,90 @@ class SaleOrderCancel(models.TransientModel):
         if not valid_to:
             raise UserError("Please select at least one recipient with a valid email in the 'To' field before sending.")
 
+        orders = self.order_id | self.order_ids
+        profiler = SendProfiler.current()
         MailMessage = self.env['mail.message'].sudo()
         MailMail = self.env['mail.mail'].sudo()
         MailNotification = self.env['mail.notification'].sudo()
 
-        # 1) chatter comment (white)
-        msg_comment = MailMessage.create({
+        # 1) chatter comments (white), orders without any valid recipient
+        # are cancelled without notice and reported back
+        values_per_order = self._get_cc_bcc_order_mail_values(orders)
+        to_notify = orders.filtered(lambda order: values_per_order[order.id]['partners'])
+        subtype_id = self.env.ref('mail.mt_comment').id
+        email_from = self.env.user.email_formatted
+        msg_comments = MailMessage.create([{
             'model': 'sale.order',
-            'res_id': self.order_id.id,
-            'subject': self.subject or f"Order {self.order_id.name} Cancelled",
-            'body': self.body or '',
-            'partner_ids': [(6, 0, valid_to.ids)],
+            'res_id': order.id,
+            'subject': values_per_order[order.id]['subject'],
+            'body': values_per_order[order.id]['body'],
+            'partner_ids': [(6, 0, values_per_order[order.id]['partners'].ids)],
             'author_id': self.author_id.id,
-            'email_from': self.env.user.email_formatted,
+            'email_from': email_from,
             'message_type': 'comment',
-            'subtype_id': self.env.ref('mail.mt_comment').id,
-        })
-
-        qweb = self.env['ir.qweb']
-        wrapped = qweb._render('mail.mail_notification_light', {
-            'body': msg_comment.body or '',
-            'company': self.order_id.company_id,
-            'record': self.order_id,
-            'message': msg_comment,
-            # ensure header text: “Your Sales Order”
-            'model_description': getattr(self.order_id, '_description', 'Sales Order'),
-        })
-        body_html = wrapped.decode() if isinstance(wrapped, bytes) else wrapped
-
-        mail = MailMail.create({
-            'subject': msg_comment.subject,
-            'email_from': msg_comment.email_from,
-            'recipient_ids': [(4, pid) for pid in valid_to.ids],
-            'auto_delete': True,
-            'body_html': body_html,
-        })
-        mail.send()
-
-        # 3) notifications → link to a separate “email” message, not the chatter comment
-        msg_email = MailMessage.create({
-            'subject': msg_comment.subject,
-            'body': body_html,
-            'email_from': msg_comment.email_from,
-            'message_type': 'email',
+            'subtype_id': subtype_id,
+        } for order in to_notify])
+        profiler.lap('create_messages')
+
+        # 2) layouts, rendered once per company and language
+        bodies = self._render_cc_bcc_cancel_layouts({
+            order: msg_comment.with_context(lang=values_per_order[order.id]['lang'])
+            for order, msg_comment in zip(to_notify, msg_comments)
         })
+        profiler.lap('render_layouts')
+
+        mail_values_list = []
+        for order, msg_comment in zip(to_notify, msg_comments):
+            # the mail inherits subject, author and record from the chatter
+            # message, only the wrapped layout is stored on the mail
+            mail_values = {
+                'mail_message_id': msg_comment.id,
+                'recipient_ids': [(4, pid) for pid in values_per_order[order.id]['partners'].ids],
+                'auto_delete': True,
+                'body_html': bodies[order.id],
+                'is_notification': True,
+            }
+            if values_per_order[order.id]['email_cc']:
+                mail_values['email_cc'] = values_per_order[order.id]['email_cc']
+            if values_per_order[order.id]['email_bcc']:
+                mail_values['email_bcc'] = values_per_order[order.id]['email_bcc']
+            mail_values_list.append(mail_values)
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(mail_values_list)
+        mails = MailMail.create(MailMail._cc_bcc_store_bodies(mail_values_list))
+
+        # 3) notifications → link to the chatter comment
         MailNotification.create([{
             'res_partner_id': pid,
-            'mail_message_id': msg_email.id,
+            'mail_message_id': msg_comment.id,
             'mail_mail_id': mail.id,
-            'notification_status': 'sent',
+            'notification_status': 'ready',
             'notification_type': 'email',
             'is_read': True,
             'author_id': self.author_id.id,
-        } for pid in valid_to.ids])
-
-        # 4) cancel order (state change)
-        return self.action_cancel()
\ No newline at end of file
+        } for order, msg_comment, mail in zip(to_notify, msg_comments, mails)
+          for pid in values_per_order[order.id]['partners'].ids])
+        profiler.lap('create_mails')
+
+        mails._cc_bcc_dispatch(force_send=not MailMail._cc_bcc_is_deferred_send(self._name))
+        profiler.lap('dispatch')
+
+        # 4) cancel orders (state change), in one go
+        action = orders.with_context(disable_cancel_warning=True).action_cancel()
+        profiler.lap('cancel')
+
+        not_notified = orders - to_notify
+        if not not_notified:
+            return action
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'type': 'warning',
+                'sticky': True,
+                'title': _("%(count)s order(s) cancelled without notification", count=len(not_notified)),
+                'message': '\n'.join(
+                    _("%(order)s: no recipient with an email", order=order.display_name) for order in not_notified
+                ),
+                'next': action if isinstance(action, dict) else {'type': 'ir.actions.act_window_close'},
+            },
+        }
@@ -0,0 +1,8 @@
+from . import test_composer_send
+from . import test_invoice_send
+from . import test_layout_skeleton
+from . import test_notify_thread
+from . import test_sale_order_cancel
+from . import test_send_metric
+from . import test_send_performance
+from . import test_smtp_pool
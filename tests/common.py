@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from odoo import Command
+from odoo.addons.account.tests.common import AccountTestInvoicingCommon
+from odoo.addons.mail.tests.common import MailCommon
+
+_logger = logging.getLogger(__name__)
+
+
+class CcBccCommon(AccountTestInvoicingCommon, MailCommon):
+    """ Common class for CC/BCC send tests: a salesperson, a customer and
+    partners to put in CC / BCC. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.salesperson = cls.env['res.users'].create({
+            'name': 'Sally Salesperson',
+            'login': 'cc_bcc_salesperson',
+            'email': 'sally.salesperson@example.com',
+            'groups_id': [Command.link(cls.env.ref('sales_team.group_sale_salesman').id)],
+        })
+        cls.customer = cls.env['res.partner'].create({
+            'name': 'Carl Customer',
+            'email': 'carl.customer@example.com',
+        })
+        cls.cc_partners = cls.env['res.partner'].create([{
+            'name': f'CC Partner {idx}',
+            'email': f'cc.partner.{idx}@example.com',
+        } for idx in range(3)])
+        cls.bcc_partners = cls.env['res.partner'].create([{
+            'name': f'BCC Partner {idx}',
+            'email': f'bcc.partner.{idx}@example.com',
+        } for idx in range(2)])
+        cls.quotation_template = cls.env.ref('sale.email_template_edi_sale')
+
+    @classmethod
+    def _create_sale_orders(cls, count):
+        return cls.env['sale.order'].create([{
+            'partner_id': cls.customer.id,
+            'user_id': cls.salesperson.id,
+            'order_line': [Command.create({'product_id': cls.product_a.id, 'price_unit': 100.0 + idx})],
+        } for idx in range(count)])
+
+    def _get_cc_bcc_commands(self, with_cc_bcc):
+        if not with_cc_bcc:
+            return {'cc_email_partner_ids': [Command.clear()], 'bcc_email_partner_ids': [Command.clear()]}
+        return {
+            'cc_email_partner_ids': [Command.set(self.cc_partners.ids)],
+            'bcc_email_partner_ids': [Command.set(self.bcc_partners.ids)],
+        }
+
+
+class CcBccPerformanceCommon(CcBccCommon):
+    """ Common class for CC/BCC send path benchmarks. Each measured scenario
+    asserts a query budget and records its query count and wall-clock time;
+    results are appended as JSON lines to the file named by the
+    ``CC_BCC_BENCH_FILE`` environment variable (default: ``cc_bcc_bench.jsonl``
+    in the temporary directory), tagged with ``CC_BCC_BENCH_REVISION`` so runs
+    of different commits can be compared. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.bench_results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.bench_results:
+            bench_file = os.environ.get('CC_BCC_BENCH_FILE') or os.path.join(tempfile.gettempdir(), 'cc_bcc_bench.jsonl')
+            with open(bench_file, 'a', encoding='utf-8') as bench_fd:
+                for result in cls.bench_results:
+                    bench_fd.write(json.dumps(result) + '\n')
+            _logger.info('CC/BCC benchmark: %s results written to %s', len(cls.bench_results), bench_file)
+        super().tearDownClass()
+
+    @contextmanager
+    def assertSendBudget(self, scenario, budget, **params):
+        """ Assert the query budget of a scenario and record its measures.
+        Yields the result dict, filled once the scenario is done. """
+        self.env.flush_all()
+        self.env.invalidate_all()
+        query_count = self.env.cr.sql_log_count
+        start = time.perf_counter()
+        result = {
+            'revision': os.environ.get('CC_BCC_BENCH_REVISION', ''),
+            'scenario': scenario,
+            'params': params,
+            'query_budget': budget,
+        }
+        with self.assertQueryCount(budget):
+            yield result
+        result.update({
+            'queries': self.env.cr.sql_log_count - query_count,
+            'seconds': round(time.perf_counter() - start, 4),
+        })
+        self.bench_results.append(result)
+
+    def assertQueriesPerRecord(self, queries_per_count, max_per_record):
+        """ Assert the marginal query cost of a scenario between its two
+        largest sizes: a step running one query per record brings it to 1
+        whatever the fixed part of the scenario costs.
+
+        :param dict queries_per_count: {record count: query count};
+        """
+        if len(queries_per_count) < 2:
+            return  # a failed size is already reported by its budget
+        (small, small_queries), (large, large_queries) = sorted(queries_per_count.items())[-2:]
+        per_record = (large_queries - small_queries) / (large - small)
+        self.assertLess(
+            per_record, max_per_record,
+            f"{per_record:.2f} queries per record between {small} and {large} records",
+        )
@@ -0,0 +1,165 @@
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import tagged, users
+
+from odoo.addons.cc_bcc.tests.common import CcBccCommon
+
+
+@tagged('post_install', '-at_install')
+class TestComposerSend(CcBccCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.orders = cls._create_sale_orders(5)
+
+    def _get_composer(self, orders, **values):
+        return self.env['mail.compose.message'].with_context(
+            default_model='sale.order',
+            default_res_ids=orders.ids,
+            default_composition_mode='comment',
+            default_template_id=self.quotation_template.id,
+        ).create({
+            'partner_ids': [Command.set(self.customer.ids)],
+            **values,
+        })
+
+    @users('admin')
+    def test_composer_mass_send_body_storage(self):
+        self.env['ir.config_parameter'].sudo().set_param('cc_bcc.body_storage', True)
+        orders = self.orders.with_env(self.env)
+        composer = self._get_composer(
+            orders,
+            subject='Price update',
+            body='<p>Our prices change next month.</p>',
+            **self._get_cc_bcc_commands(True),
+        )
+        with self.mock_mail_gateway():
+            composer.action_send_mail()
+
+        # one shared layout skeleton and one shared inner body for the batch
+        # a layout rendered per mail would store one body per order instead
+        self.assertEqual(
+            self.env['cc.bcc.mail.body'].search_count([]), 2,
+            "The layouts were not rendered from a shared skeleton",
+        )
+        self.assertEqual(len(self._mails), len(orders))
+        self.assertTrue(all('Our prices change next month.' in mail['body'] for mail in self._mails))
+
+    def test_mail_body_storage_reuses_existing(self):
+        MailBody = self.env['cc.bcc.mail.body']
+        checksum_b = MailBody._get_checksum('<p>B</p>')
+        first = MailBody._get_body_ids(['<p>A</p>', '<p>B</p>'])
+        # an already stored body is selected back instead of violating the constraint
+        second = MailBody._get_body_ids(['<p>B</p>', '<p>C</p>', '<p>C</p>'])
+        self.assertEqual(second[checksum_b], first[checksum_b])
+        self.assertEqual(len(second), 2)
+        self.assertEqual(MailBody.browse(second[checksum_b]).body, '<p>B</p>')
+        self.assertEqual(MailBody.search_count([]), 3)
+
+    @users('admin')
+    def test_composer_mass_send_shared_attachments(self):
+        orders = self.orders.with_env(self.env)
+        attachments = self.env['ir.attachment'].create([{
+            'name': f'brochure_{idx}.pdf',
+            'raw': b'%PDF-1.4 brochure',
+            'res_model': 'mail.compose.message',
+            'res_id': 0,
+        } for idx in range(3)])
+        composer = self._get_composer(orders, attachment_ids=[Command.set(attachments.ids)])
+        with self.mock_mail_gateway():
+            composer.action_send_mail()
+
+        # every message keeps the same attachments, nothing is copied
+        messages = self.env['mail.message'].search([
+            ('model', '=', 'sale.order'), ('res_id', 'in', orders.ids), ('message_type', '=', 'comment'),
+        ])
+        self.assertEqual(len(messages), len(orders))
+        for message in messages:
+            self.assertEqual(message.attachment_ids & attachments, attachments)
+        self.assertEqual(self.env['ir.attachment'].search_count([('name', '=like', 'brochure_%')]), len(attachments))
+
+    def test_build_email_shared_mime_parts(self):
+        IrMailServer = self.env['ir.mail_server'].with_context(cc_bcc_mime_parts={})
+        emails = [IrMailServer.build_email(
+            'sally.salesperson@example.com', [f'customer.{idx}@example.com'], 'Brochure', '<p>Brochure</p>',
+            subtype='html', attachments=[('brochure.pdf', b'%PDF-1.4 brochure', 'application/pdf')],
+        ) for idx in range(2)]
+        parts = [list(email.iter_attachments()) for email in emails]
+        self.assertEqual(len(parts[0]), 1)
+        self.assertIs(parts[0][0], parts[1][0])
+        self.assertEqual(parts[0][0].get_filename(), 'brochure.pdf')
+
+    @users('admin')
+    def test_composer_streamed_send_resume(self):
+        self.env['ir.config_parameter'].sudo().set_param('cc_bcc.streaming_chunk_size', 2)
+        orders = self.orders.with_env(self.env)
+        self._get_composer(orders, **self._get_cc_bcc_commands(True)).action_send_mail()
+        job = self.env['cc.bcc.send.job'].sudo().search([('model', '=', 'sale.order')], limit=1)
+        self.assertEqual((job.state, job.record_count, job.next_index), ('pending', 5, 0))
+
+        SendJob = self.registry['cc.bcc.send.job']
+        send_chunk = SendJob._send_chunk
+        calls = []
+
+        def _send_chunk_failing_second(job, res_ids):
+            calls.append(res_ids)
+            if len(calls) == 2:
+                raise ValueError('SMTP relay gone')
+            return send_chunk(job, res_ids)
+
+        with self.mock_mail_gateway(), \
+             patch.object(SendJob, '_send_chunk', autospec=True, side_effect=_send_chunk_failing_second):
+            job._process()
+        self.assertEqual((job.state, job.next_index), ('failed', 2))
+
+        # resuming sends the remaining documents only, once
+        job.action_resume()
+        with self.mock_mail_gateway():
+            job._process()
+        self.assertEqual((job.state, job.next_index), ('done', 5))
+        messages = self.env['mail.message'].search([
+            ('model', '=', 'sale.order'), ('res_id', 'in', orders.ids), ('message_type', '=', 'comment'),
+        ])
+        self.assertEqual(sorted(messages.mapped('res_id')), sorted(orders.ids))
+
+    def test_dedupe_mail_values(self):
+        vals_list = [{
+            'recipient_ids': [Command.link(self.customer.id)],
+            'email_to': 'direct@example.com',
+            'email_cc': f'"Carl" <{self.customer.email}>,{self.cc_partners[0].email},DIRECT@example.com',
+            'email_bcc': f'{self.cc_partners[0].email},{self.bcc_partners[0].email},{self.bcc_partners[0].email}',
+        }, {
+            'recipient_ids': [Command.link(self.cc_partners[0].id)],
+            'email_cc': self.cc_partners[0].email,
+        }]
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(vals_list)
+        # To > CC > BCC, each address once
+        self.assertEqual(vals_list[0]['email_cc'], self.cc_partners[0].email)
+        self.assertEqual(vals_list[0]['email_bcc'], self.bcc_partners[0].email)
+        self.assertFalse(vals_list[1]['email_cc'])
+
+    def test_dedupe_mail_values_partner_ids(self):
+        # mass mode rendered values: To partners as plain IDs
+        vals_list = [{
+            'partner_ids': [self.customer.id],
+            'email_cc': f'{self.customer.email},{self.cc_partners[0].email}',
+        }]
+        self.env['res.partner']._cc_bcc_dedupe_mail_values(vals_list)
+        self.assertEqual(vals_list[0]['email_cc'], self.cc_partners[0].email)
+
+    @users('admin')
+    def test_composer_mass_send_cc_not_to(self):
+        orders = self.orders.with_env(self.env)
+        composer = self._get_composer(
+            orders,
+            subject='Price update',
+            body='<p>Our prices change next month.</p>',
+            cc_email_partner_ids=[Command.set((self.customer | self.cc_partners[0]).ids)],
+        )
+        with self.mock_mail_gateway():
+            composer.action_send_mail()
+        for mail in self._new_mails:
+            self.assertIn(self.customer, mail.recipient_ids)
+            self.assertEqual(mail.email_cc, self.cc_partners[0].email)
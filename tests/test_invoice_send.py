@@ -0,0 +1,110 @@
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import tagged, users
+from odoo.tools import mute_logger
+
+from odoo.addons.cc_bcc.tests.common import CcBccCommon
+
+
+@tagged('post_install', '-at_install')
+class TestInvoiceSend(CcBccCommon):
+
+    def _create_invoices(self, count):
+        return self.env['account.move'].concat(*(
+            self.init_invoice('out_invoice', partner=self.customer, products=self.product_a, post=True)
+            for _idx in range(count)
+        ))
+
+    @users('admin')
+    def test_invoice_batch_send_with_failing_move(self):
+        invoices = self._create_invoices(3)
+        wizard = self.env['account.move.send.wizard'].with_context(
+            active_model='account.move', active_ids=invoices.ids, cc_bcc_batch_send=True,
+        ).create({
+            'mail_partner_ids': [Command.set(self.customer.ids)],
+        })
+        self.assertEqual(wizard.move_id | wizard.batch_move_ids, invoices)
+
+        failing = invoices[1]
+        Wizard = self.registry['account.move.send.wizard']
+        get_header_lines = Wizard._get_cc_bcc_header_lines
+
+        def _get_header_lines_failing(wizard, move):
+            if move == failing:
+                raise ValueError('Broken header')
+            return get_header_lines(wizard, move)
+
+        with self.mock_mail_gateway(), \
+             patch.object(Wizard, '_get_cc_bcc_header_lines', autospec=True, side_effect=_get_header_lines_failing):
+            action = wizard.action_send_and_print()
+
+        # the failing invoice is reported, the others are sent
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertIn(failing.display_name, action['params']['message'])
+        self.assertIn('Broken header', action['params']['message'])
+        self.assertEqual(set(self._new_mails.mapped('res_id')), set((invoices - failing).ids))
+        # no message is left on the failing invoice
+        self.assertFalse(self.env['mail.message'].search([
+            ('model', '=', 'account.move'), ('res_id', '=', failing.id), ('message_type', '=', 'email'),
+        ]))
+
+    @users('admin')
+    def test_invoice_batch_send_with_database_error(self):
+        invoices = self._create_invoices(3)
+        wizard = self.env['account.move.send.wizard'].with_context(
+            active_model='account.move', active_ids=invoices.ids, cc_bcc_batch_send=True,
+        ).create({
+            'mail_partner_ids': [Command.set(self.customer.ids)],
+        })
+
+        failing = invoices[1]
+        Wizard = self.registry['account.move.send.wizard']
+        get_header_lines = Wizard._get_cc_bcc_header_lines
+
+        def _get_header_lines_failing(wizard, move):
+            if move == failing:
+                wizard.env.cr.execute('SELECT 1 / 0')
+            return get_header_lines(wizard, move)
+
+        with self.mock_mail_gateway(), mute_logger('odoo.sql_db'), \
+             patch.object(Wizard, '_get_cc_bcc_header_lines', autospec=True, side_effect=_get_header_lines_failing):
+            action = wizard.action_send_and_print()
+
+        # the aborted statement is rolled back, the rest of the batch is sent
+        self.assertIn(failing.display_name, action['params']['message'])
+        self.assertEqual(set(self._new_mails.mapped('res_id')), set((invoices - failing).ids))
+
+    def test_invoice_send_cron_cc_bcc(self):
+        invoices = self._create_invoices(3)
+        invoices.sending_data = {
+            'author_user_id': self.env.user.id,
+            'author_partner_id': self.env.user.partner_id.id,
+            'sending_methods': ['email'],
+            'cc_email_partner_ids': self.cc_partners.ids,
+            'bcc_email_partner_ids': self.bcc_partners.ids,
+        }
+        with self.mock_mail_gateway():
+            self.env['account.move']._cron_account_move_send()
+
+        self.assertFalse(any(invoices.mapped('sending_data')))
+        self.assertEqual(len(self._new_mails), len(invoices))
+        for mail in self._new_mails:
+            self.assertEqual(mail.email_cc, ','.join(self.cc_partners.mapped('email')))
+            self.assertEqual(mail.email_bcc, ','.join(self.bcc_partners.mapped('email')))
+
+    def test_cc_bcc_email_string_prefetched(self):
+        Partner = self.env['res.partner']
+        partners = self.cc_partners | self.bcc_partners
+        expected = ','.join(partners.mapped('email'))
+        # emails prefetched for a batch are not read again per move
+        partners.invalidate_recordset()
+        partners.fetch(['email', 'write_date'])
+        with self.assertQueryCount(0):
+            self.assertEqual(Partner._cc_bcc_get_email_string(partners.ids), expected)
+
+        # a partner deleted meanwhile is left out
+        deleted = Partner.create({'name': 'Deleted', 'email': 'deleted@example.com'})
+        deleted_id = deleted.id
+        deleted.unlink()
+        self.assertEqual(Partner._cc_bcc_get_email_string(partners.ids + [deleted_id]), expected)
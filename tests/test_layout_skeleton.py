@@ -0,0 +1,83 @@
+from unittest.mock import patch
+
+from odoo import Command
+from odoo.tests import tagged, users
+
+from odoo.addons.cc_bcc.tests.common import CcBccCommon
+
+
+@tagged('post_install', '-at_install')
+class TestLayoutSkeleton(CcBccCommon):
+    """ Layouts rendered from a cached skeleton must match a full render of
+    the same layout, relative links of the body included. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.order = cls._create_sale_orders(1)
+        cls.body = '<p>See <a href="/my/orders">your orders</a> <img src="/web/image/res.partner/1/avatar_128"/></p>'
+        cls.base_url = cls.env['ir.config_parameter'].sudo().get_param('web.base.url')
+
+    def _send_twice(self, model_name, send):
+        """ Send once through the skeleton cache and once with a full render,
+        return both mail bodies. """
+        self.env.registry.clear_cache('templates')
+        Model = self.registry[model_name]
+        get_layout_skeleton = Model._cc_bcc_get_layout_skeleton
+        skeletons = []
+
+        def _get_layout_skeleton(record, *args, **kwargs):
+            skeletons.append(get_layout_skeleton(record, *args, **kwargs))
+            return skeletons[-1]
+
+        bodies = []
+        for use_skeleton in (True, False):
+            with self.mock_mail_gateway():
+                if use_skeleton:
+                    with patch.object(Model, '_cc_bcc_get_layout_skeleton', autospec=True, side_effect=_get_layout_skeleton):
+                        send()
+                    self.assertTrue(skeletons and all(skeletons), "The layout was not rendered from a skeleton")
+                else:
+                    with patch.object(Model, '_cc_bcc_get_layout_skeleton', return_value=None):
+                        send()
+            self.assertEqual(len(self._new_mails), 1)
+            bodies.append(str(self._new_mails.body_html))
+        return bodies
+
+    @users('admin')
+    def test_composer_skeleton_matches_full_render(self):
+        order = self.order.with_env(self.env)
+
+        def send():
+            self.env['mail.compose.message'].with_context(
+                default_model='sale.order',
+                default_res_ids=order.ids,
+                default_composition_mode='comment',
+                cc_bcc_deferred_send=True,
+            ).create({
+                'partner_ids': [Command.set(self.customer.ids)],
+                'subject': 'Your orders',
+                'body': self.body,
+            }).action_send_mail()
+
+        skeleton_body, full_body = self._send_twice('sale.order', send)
+        self.assertEqual(skeleton_body, full_body)
+        self.assertIn(f'href="{self.base_url}/my/orders"', skeleton_body)
+        self.assertIn(f'src="{self.base_url}/web/image/res.partner/1/avatar_128"', skeleton_body)
+
+    @users('admin')
+    def test_invoice_skeleton_matches_full_render(self):
+        invoice = self.init_invoice('out_invoice', partner=self.customer, products=self.product_a, post=True)
+
+        def send():
+            wizard = self.env['account.move.send.wizard'].with_context(
+                active_model='account.move', active_ids=invoice.ids, cc_bcc_deferred_send=True,
+            ).create({
+                'mail_partner_ids': [Command.set(self.customer.ids)],
+            })
+            wizard.mail_body = self.body
+            wizard.action_send_and_print()
+
+        skeleton_body, full_body = self._send_twice('account.move', send)
+        self.assertEqual(skeleton_body, full_body)
+        self.assertIn(f'href="{self.base_url}/my/orders"', skeleton_body)
@@ -0,0 +1,55 @@
+from odoo.tests import tagged, users
+
+from odoo.addons.cc_bcc.tests.common import CcBccCommon
+
+
+@tagged('post_install', '-at_install')
+class TestNotifyThread(CcBccCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.order = cls._create_sale_orders(1)
+
+    @users('admin')
+    def test_notify_thread_bcc_customer_layout(self):
+        order = self.order.with_env(self.env)
+        email_bcc = ','.join(self.bcc_partners.mapped('email'))
+        for partners, bcc_recipients in (
+            (self.salesperson.partner_id | self.customer, self.customer),
+            # internal recipients only: BCC gets a mail of its own
+            (self.salesperson.partner_id, self.env['res.partner']),
+        ):
+            with self.subTest(partners=partners.mapped('name')):
+                with self.mock_mail_gateway():
+                    order.message_post(
+                        body='Customer update',
+                        message_type='comment',
+                        subtype_xmlid='mail.mt_comment',
+                        partner_ids=partners.ids,
+                        email_bcc=email_bcc,
+                    )
+                bcc_mail = self._new_mails.filtered('email_bcc')
+                self.assertEqual(len(bcc_mail), 1)
+                self.assertEqual(bcc_mail.recipient_ids, bcc_recipients)
+                # never the internal layout
+                self.assertNotIn(self.salesperson.partner_id, bcc_mail.recipient_ids)
+
+    @users('admin')
+    def test_notify_thread_cc_dedupe_across_groups(self):
+        order = self.order.with_env(self.env)
+        email_cc = ','.join([self.salesperson.email] + self.cc_partners.mapped('email'))
+        with self.mock_mail_gateway():
+            order.message_post(
+                body='Customer update',
+                message_type='comment',
+                subtype_xmlid='mail.mt_comment',
+                # salesperson in the internal group, customer in the customer group
+                partner_ids=(self.salesperson.partner_id | self.customer).ids,
+                email_cc=email_cc,
+            )
+        cc_mail = self._new_mails.filtered('email_cc')
+        # CC on one mail only, without the already notified salesperson
+        self.assertEqual(len(cc_mail), 1)
+        self.assertEqual(cc_mail.recipient_ids, self.customer)
+        self.assertEqual(cc_mail.email_cc, ','.join(self.cc_partners.mapped('email')))
@@ -0,0 +1,94 @@
+from odoo import Command
+from odoo.tests import tagged, users
+
+from odoo.addons.cc_bcc.tests.common import CcBccCommon
+
+
+@tagged('post_install', '-at_install')
+class TestSaleOrderCancel(CcBccCommon):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.cancel_template = cls.env.ref('sale.mail_template_sale_cancellation')
+
+    @users('admin')
+    def test_sale_order_cancel_send(self):
+        order = self._create_sale_orders(1).with_env(self.env)
+        order.action_confirm()
+        wizard = self.env['sale.order.cancel'].with_context(default_order_id=order.id).create({
+            'template_id': self.cancel_template.id,
+            'recipient_ids': [Command.set(self.customer.ids)],
+            **self._get_cc_bcc_commands(True),
+        })
+        with self.mock_mail_gateway():
+            wizard.action_send_mail_and_cancel()
+
+        self.assertEqual(order.state, 'cancel')
+        # a single chatter message carries the notification
+        notification = self.env['mail.notification'].search([
+            ('res_partner_id', '=', self.customer.id),
+            ('mail_message_id.model', '=', 'sale.order'),
+            ('mail_message_id.res_id', '=', order.id),
+        ])
+        self.assertEqual(len(notification), 1)
+        self.assertEqual(notification.mail_message_id.message_type, 'comment')
+
+    @users('admin')
+    def test_sale_order_mass_cancel_cc_per_order(self):
+        other_salesperson = self.env['res.users'].sudo().create({
+            'name': 'Oscar Other Salesperson',
+            'login': 'cc_bcc_other_salesperson',
+            'email': 'oscar.salesperson@example.com',
+        })
+        orders = self._create_sale_orders(2).with_env(self.env)
+        orders[1].user_id = other_salesperson
+        orders.action_confirm()
+        wizard = self.env['sale.order.cancel'].with_context(
+            active_model='sale.order',
+            active_ids=orders.ids,
+        ).create({
+            'template_id': self.cancel_template.id,
+            'recipient_ids': [Command.set(self.customer.ids)],
+        })
+        self.assertEqual(wizard.order_id | wizard.order_ids, orders)
+        # the wizard CC comes from its own order only
+        self.assertEqual(wizard.cc_email_partner_ids, self.salesperson.partner_id)
+        with self.mock_mail_gateway():
+            wizard.action_send_mail_and_cancel()
+
+        self.assertEqual(set(orders.mapped('state')), {'cancel'})
+        cc_per_order = {mail.res_id: mail.email_cc for mail in self._new_mails}
+        self.assertEqual(cc_per_order, {
+            orders[0].id: self.salesperson.email,
+            orders[1].id: other_salesperson.email,
+        })
+
+    @users('admin')
+    def test_sale_order_mass_cancel_without_template(self):
+        no_email_customer = self.env['res.partner'].create({'name': 'Nora No Email'})
+        orders = self._create_sale_orders(3).with_env(self.env)
+        orders[2].partner_id = no_email_customer
+        orders.action_confirm()
+        wizard = self.env['sale.order.cancel'].with_context(
+            active_model='sale.order',
+            active_ids=orders.ids,
+        ).create({
+            'template_id': False,
+            'recipient_ids': [Command.set(self.customer.ids)],
+            'subject': f'Order {orders[0].name} Cancelled',
+            'body': f'<p>Your order {orders[0].name} has been cancelled.</p>',
+        })
+        with self.mock_mail_gateway():
+            action = wizard.action_send_mail_and_cancel()
+
+        self.assertEqual(set(orders.mapped('state')), {'cancel'})
+        mail_per_order = {mail.res_id: mail for mail in self._new_mails}
+        self.assertEqual(set(mail_per_order), set(orders[:2].ids))
+        # the body edited for the wizard order is not sent for the other orders
+        other_body = str(mail_per_order[orders[1].id].body_html)
+        self.assertIn(orders[1].name, other_body)
+        self.assertNotIn(orders[0].name, other_body)
+        # the order without recipient is reported back
+        self.assertEqual(action['tag'], 'display_notification')
+        self.assertIn(orders[2].display_name, action['params']['message'])
@@ -0,0 +1,26 @@
+import os
+import tempfile
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestSendMetric(TransactionCase):
+
+    def test_nested_sends_profiled_once(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param('cc_bcc.send_metrics', True)
+        Metric = self.env['cc.bcc.send.metric'].with_context(cc_bcc_profile=True)
+        with tempfile.TemporaryDirectory() as profile_dir:
+            ICP.set_param('cc_bcc.send_profile_dir', profile_dir)
+            with Metric._cc_bcc_send_profiler('outer', 2) as outer:
+                with Metric._cc_bcc_send_profiler('inner', 1) as inner:
+                    inner.lap('smtp')
+                outer.lap('dispatch')
+            self.assertEqual(len(os.listdir(profile_dir)), 1)
+
+        metrics = Metric.search([('send_path', 'in', ('outer', 'inner'))])
+        self.assertEqual(
+            sorted(metrics.mapped(lambda metric: (metric.send_path, metric.phase))),
+            [('inner', 'smtp'), ('inner', 'total'), ('outer', 'dispatch'), ('outer', 'total')],
+        )
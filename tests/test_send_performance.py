@@ -0,0 +1,191 @@
+from odoo import Command
+from odoo.tests import tagged, users
+
+from odoo.addons.cc_bcc.tests.common import CcBccPerformanceCommon
+
+
+@tagged('post_install', '-at_install', '-standard', 'cc_bcc_perf')
+class TestSendPerformance(CcBccPerformanceCommon):
+    """ Query budgets are pinned near the measured counts: a fixed part plus
+    a tenth of a query per record for batches split in chunks. Mass sends
+    also assert their marginal cost per record, so a regression turning a
+    batched step back into a per record one fails whatever the fixed part.
+    Run with ``--test-tags cc_bcc_perf``; behaviours are covered by the
+    functional tests. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.orders = cls._create_sale_orders(1000)
+        # the quotation PDF is rendered per record by core, outside of the
+        # measured send path
+        cls.quotation_template.report_template_ids = False
+
+    @users('admin')
+    def test_composer_mass_send(self):
+        for with_cc_bcc in (False, True):
+            queries_per_count = {}
+            for count in (1, 10, 100, 1000):
+                with self.subTest(count=count, with_cc_bcc=with_cc_bcc):
+                    orders = self.orders[:count].with_env(self.env)
+                    composer = self.env['mail.compose.message'].with_context(
+                        default_model='sale.order',
+                        default_res_ids=orders.ids,
+                        default_composition_mode='comment',
+                        default_template_id=self.quotation_template.id,
+                    ).create({
+                        'partner_ids': [Command.set(self.customer.ids)],
+                        **self._get_cc_bcc_commands(with_cc_bcc),
+                    })
+                    with self.mock_mail_gateway(), \
+                         self.assertSendBudget('mail.compose.message', 120 + count // 10,
+                                               records=count, cc_bcc=with_cc_bcc) as result:
+                        composer.action_send_mail()
+                    queries_per_count[count] = result['queries']
+
+                    self.assertEqual(len(self._new_mails), count)
+                    if with_cc_bcc:
+                        self.assertTrue(all(mail.email_cc and mail.email_bcc for mail in self._new_mails))
+            with self.subTest(with_cc_bcc=with_cc_bcc):
+                self.assertQueriesPerRecord(queries_per_count, 0.5)
+
+    @users('admin')
+    def test_composer_mass_send_body_storage(self):
+        self.env['ir.config_parameter'].sudo().set_param('cc_bcc.body_storage', True)
+        orders = self.orders[:50].with_env(self.env)
+        composer = self.env['mail.compose.message'].with_context(
+            default_model='sale.order',
+            default_res_ids=orders.ids,
+            default_composition_mode='comment',
+            default_template_id=self.quotation_template.id,
+        ).create({
+            'partner_ids': [Command.set(self.customer.ids)],
+            'subject': 'Price update',
+            'body': '<p>Our prices change next month.</p>',
+            **self._get_cc_bcc_commands(True),
+        })
+        with self.mock_mail_gateway(), \
+             self.assertSendBudget('mail.compose.message', 120 + len(orders) // 10,
+                                   records=len(orders), cc_bcc=True, body_storage=True):
+            composer.action_send_mail()
+        self.assertEqual(len(self._mails), len(orders))
+
+    @users('admin')
+    def test_composer_mass_send_shared_attachments(self):
+        orders = self.orders[:10].with_env(self.env)
+        attachments = self.env['ir.attachment'].create([{
+            'name': f'brochure_{idx}.pdf',
+            'raw': b'%PDF-1.4 brochure',
+            'res_model': 'mail.compose.message',
+            'res_id': 0,
+        } for idx in range(3)])
+        composer = self.env['mail.compose.message'].with_context(
+            default_model='sale.order',
+            default_res_ids=orders.ids,
+            default_composition_mode='comment',
+            default_template_id=self.quotation_template.id,
+        ).create({
+            'partner_ids': [Command.set(self.customer.ids)],
+            'attachment_ids': [Command.set(attachments.ids)],
+        })
+        with self.mock_mail_gateway(), \
+             self.assertSendBudget('mail.compose.message', 120 + len(orders) // 10,
+                                   records=len(orders), attachments=len(attachments)):
+            composer.action_send_mail()
+        self.assertEqual(len(self._new_mails), len(orders))
+
+    @users('admin')
+    def test_invoice_send_many_attachments(self):
+        invoice = self.init_invoice('out_invoice', partner=self.customer, products=self.product_a, post=True)
+        attachments = self.env['ir.attachment'].create([{
+            'name': f'edi_{idx}.xml',
+            'raw': b'<xml/>',
+            'res_model': 'account.move',
+            'res_id': invoice.id,
+        } for idx in range(50)])
+        for with_cc_bcc in (False, True):
+            with self.subTest(with_cc_bcc=with_cc_bcc):
+                wizard = self.env['account.move.send.wizard'].with_context(
+                    active_model='account.move', active_ids=invoice.ids,
+                ).create({
+                    'mail_partner_ids': [Command.set(self.customer.ids)],
+                    **self._get_cc_bcc_commands(with_cc_bcc),
+                })
+                # manual entries referenced by name, resolved against the invoice attachments
+                wizard.mail_attachments_widget = (wizard.mail_attachments_widget or []) + [{
+                    'id': f'placeholder_{attachment.name}',
+                    'name': attachment.name,
+                    'mimetype': 'application/xml',
+                    'manual': True,
+                } for attachment in attachments]
+                with self.mock_mail_gateway(), \
+                     self.assertSendBudget('account.move.send.wizard', 220,
+                                           attachments=len(attachments), cc_bcc=with_cc_bcc):
+                    wizard.action_send_and_print()
+
+                self.assertEqual(len(self._new_mails), 1)
+                self.assertEqual(self._new_mails.attachment_ids & attachments, attachments)
+
+    @users('admin')
+    def test_sale_order_cancel_send(self):
+        for with_cc_bcc in (False, True):
+            with self.subTest(with_cc_bcc=with_cc_bcc):
+                order = self._create_sale_orders(1).with_env(self.env)
+                order.action_confirm()
+                wizard = self.env['sale.order.cancel'].with_context(default_order_id=order.id).create({
+                    'template_id': self.env.ref('sale.mail_template_sale_cancellation').id,
+                    'recipient_ids': [Command.set(self.customer.ids)],
+                    **self._get_cc_bcc_commands(with_cc_bcc),
+                })
+                with self.mock_mail_gateway(), \
+                     self.assertSendBudget('sale.order.cancel', 90, cc_bcc=with_cc_bcc):
+                    wizard.action_send_mail_and_cancel()
+                self.assertEqual(order.state, 'cancel')
+
+    @users('admin')
+    def test_sale_order_mass_cancel_send(self):
+        for with_cc_bcc in (False, True):
+            with self.subTest(with_cc_bcc=with_cc_bcc):
+                orders = self._create_sale_orders(20).with_env(self.env)
+                orders.action_confirm()
+                wizard = self.env['sale.order.cancel'].with_context(
+                    active_model='sale.order',
+                    active_ids=orders.ids,
+                ).create({
+                    'template_id': self.env.ref('sale.mail_template_sale_cancellation').id,
+                    'recipient_ids': [Command.set(self.customer.ids)],
+                    **self._get_cc_bcc_commands(with_cc_bcc),
+                })
+                with self.mock_mail_gateway(), \
+                     self.assertSendBudget('sale.order.cancel', 250, orders=len(orders), cc_bcc=with_cc_bcc):
+                    wizard.action_send_mail_and_cancel()
+
+                self.assertEqual(set(orders.mapped('state')), {'cancel'})
+                self.assertEqual(len(self._new_mails), len(orders))
+
+    @users('admin')
+    def test_notify_thread_many_followers(self):
+        followers = self.env['res.partner'].create([{
+            'name': f'Follower {idx}',
+            'email': f'follower.{idx}@example.com',
+        } for idx in range(2000)])
+        order = self.orders[0].with_env(self.env)
+        order.message_subscribe(partner_ids=followers.ids)
+        email_cc = ','.join(self.cc_partners.mapped('email'))
+        email_bcc = ','.join(self.bcc_partners.mapped('email'))
+        for with_cc_bcc in (False, True):
+            with self.subTest(with_cc_bcc=with_cc_bcc):
+                notify_params = {'email_cc': email_cc, 'email_bcc': email_bcc} if with_cc_bcc else {}
+                with self.mock_mail_gateway(), \
+                     self.assertSendBudget('mail.thread._notify_thread_by_email', 400,
+                                           followers=len(followers), cc_bcc=with_cc_bcc):
+                    order.message_post(
+                        body='Follower notification',
+                        message_type='comment',
+                        subtype_xmlid='mail.mt_comment',
+                        **notify_params,
+                    )
+
+                if with_cc_bcc:
+                    self.assertEqual(len(self._new_mails.filtered('email_bcc')), 1)
+                    self.assertEqual(len(self._new_mails.filtered('email_cc')), 1)
@@ -0,0 +1,129 @@
+import smtplib
+import socket
+import unittest
+from unittest.mock import patch
+
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.mail.tests.common import mail_new_test_user
+
+try:
+    from aiosmtpd.controller import Controller
+except ImportError:
+    Controller = None
+
+
+class CountingHandler:
+    """ aiosmtpd handler counting SMTP connections (EHLO) and messages. When
+    ``drop_at`` is set, the connection is dropped instead of accepting that
+    message. """
+
+    def __init__(self):
+        self.sessions = 0
+        self.messages = 0
+        self.drop_at = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.drop_at and self.messages + 1 == self.drop_at:
+            self.drop_at = 0
+            server.transport.close()
+            return '421 Closing connection'
+        self.messages += 1
+        return '250 Message accepted for delivery'
+
+
+@tagged('post_install', '-at_install')
+@unittest.skipIf(Controller is None, "aiosmtpd is required to run a local SMTP server")
+class TestSmtpPool(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            cls.smtp_port = sock.getsockname()[1]
+        cls.handler = CountingHandler()
+        cls.controller = Controller(cls.handler, hostname='127.0.0.1', port=cls.smtp_port)
+        cls.controller.start()
+        cls.addClassCleanup(cls.controller.stop)
+
+        cls.mail_server = cls.env['ir.mail_server'].create({
+            'name': 'Local stand-in',
+            'smtp_host': '127.0.0.1',
+            'smtp_port': cls.smtp_port,
+            'smtp_encryption': 'none',
+        })
+
+    def setUp(self):
+        super().setUp()
+        self.handler.sessions = self.handler.messages = self.handler.drop_at = 0
+        # really talk to the stand-in server instead of skipping SMTP in tests
+        patcher = patch.object(type(self.env['ir.mail_server']), '_is_test_mode', lambda self: False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _create_mails(self, count):
+        return self.env['mail.mail'].create([{
+            'subject': f'Pooled {idx}',
+            'body_html': '<p>Pooled</p>',
+            'email_from': 'sender@example.com',
+            'email_to': f'recipient.{idx}@example.com',
+            'mail_server_id': self.mail_server.id,
+        } for idx in range(count)])
+
+    def test_send_pooled_single_session(self):
+        mails = self._create_mails(30)
+        mails._cc_bcc_send_pooled()
+        self.assertEqual(self.handler.messages, 30)
+        self.assertEqual(self.handler.sessions, 1)
+        self.assertEqual(set(mails.mapped('state')), {'sent'})
+
+    def test_send_pooled_session_cap(self):
+        self.env['ir.config_parameter'].sudo().set_param('cc_bcc.smtp_session_batch_size', 10)
+        self._create_mails(25)._cc_bcc_send_pooled()
+        self.assertEqual(self.handler.messages, 25)
+        self.assertEqual(self.handler.sessions, 3)
+
+    def test_send_pooled_retry_dropped_session(self):
+        self.handler.drop_at = 10
+        mails = self._create_mails(30)
+        mails._cc_bcc_send_pooled()
+        # the mails left after the drop are sent in a second session
+        self.assertEqual(self.handler.messages, 30)
+        self.assertEqual(self.handler.sessions, 2)
+        self.assertEqual(set(mails.mapped('state')), {'sent'})
+
+    def test_send_pooled_retry_connect_failure(self):
+        smtp_connect = smtplib.SMTP.connect
+        attempts = []
+
+        def _connect_refused_once(smtp, *args, **kwargs):
+            attempts.append(args)
+            if len(attempts) == 1:
+                raise ConnectionRefusedError('Connection refused')
+            return smtp_connect(smtp, *args, **kwargs)
+
+        mails = self._create_mails(5)
+        with patch.object(smtplib.SMTP, 'connect', autospec=True, side_effect=_connect_refused_once):
+            mails._cc_bcc_send_pooled()
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.handler.messages, 5)
+        self.assertEqual(self.handler.sessions, 1)
+        self.assertEqual(set(mails.mapped('state')), {'sent'})
+
+    def test_send_pooled_after_commit_as_user(self):
+        salesperson = mail_new_test_user(
+            self.env, login='cc_bcc_pool_salesperson', groups='base.group_user,sales_team.group_sale_salesman',
+        )
+        mails = self._create_mails(3)
+        # post-commit branch, as taken outside of test mode by a regular user
+        mails.with_user(salesperson)._cc_bcc_send_pooled_after_commit()
+        self.env.cr.postcommit.run()
+        mails.invalidate_recordset()
+        self.assertEqual(self.handler.messages, 3)
+        self.assertEqual(set(mails.mapped('state')), {'sent'})